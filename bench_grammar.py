@@ -0,0 +1,85 @@
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datasets import load_from_disk
+
+from grammar_inference import (
+    GrammarBatcher,
+    GRAMMAR_BATCH_SIZE,
+    GRAMMAR_BATCH_WAIT_MS,
+    correct_grammar_unbatched,
+    load_model,
+)
+
+# Throughput benchmark: per-call T5 generate vs. the micro-batching queue,
+# under the same number of concurrent callers
+
+TEST_DATA_DIR = "data/grammar_correction_pairs"
+
+
+def load_sentences(count: int, data_dir: str = TEST_DATA_DIR):
+    sources = load_from_disk(data_dir)["test"]["source"]
+    return [sources[i % len(sources)] for i in range(count)]
+
+
+def run(correct, sentences, concurrency: int):
+    latencies = []
+
+    def timed(sentence):
+        start = time.perf_counter()
+        correct(sentence)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, sentences))
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        "seconds": elapsed,
+        "throughput": len(sentences) / elapsed,
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:<10} {result['throughput']:7.2f} sent/s   "
+        f"p50 {result['p50_ms']:8.1f} ms   p95 {result['p95_ms']:8.1f} ms   ({result['seconds']:.1f}s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call and batched grammar correction throughput")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=GRAMMAR_BATCH_SIZE)
+    parser.add_argument("--wait-ms", type=float, default=GRAMMAR_BATCH_WAIT_MS)
+    parser.add_argument("--data-dir", default=TEST_DATA_DIR)
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.requests, args.data_dir)
+
+    # Load and warm up once so neither run pays for it
+    load_model()
+    correct_grammar_unbatched(sentences[0])
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent callers, "
+          f"batch size {args.batch_size}, wait {args.wait_ms} ms")
+
+    per_call = run(correct_grammar_unbatched, sentences, args.concurrency)
+    print_result("per-call", per_call)
+
+    batcher = GrammarBatcher(args.batch_size, args.wait_ms)
+    batched = run(batcher.correct, sentences, args.concurrency)
+    print_result("batched", batched)
+
+    stats = batcher.get_stats()
+    print(f"avg batch size {stats['avg_batch_size']:.2f}, speedup {batched['throughput'] / per_call['throughput']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,285 @@
 import os
-import json
+import time
+import fcntl
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
-# Store chat sessions as JSON files
-SESSIONS_DIR = "data/sessions"
-os.makedirs(SESSIONS_DIR, exist_ok=True)
+from session_store import JsonSessionBackend, SqliteSessionBackend, apply_message, slice_session
 
+# Storage backend for chat sessions: "json" (files under data/sessions) or "sqlite"
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "json")
 
-def session_path(session_id: str):
-    return os.path.join(SESSIONS_DIR, f"{session_id}.json")
+# Hot sessions stay in memory; appends are written back to the backend in batches.
+# Set SESSION_CACHE_SIZE=0 to write through, e.g. with several workers on SQLite.
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "128"))
+FLUSH_INTERVAL_SECONDS = 1.0
+FLUSH_DIRTY_THRESHOLD = 32
 
-# Get all sessions except quiz_session
+# The JSON backend and the write-back cache keep session state in this process, so only one
+# process may use them; it holds this lock for its lifetime, whatever started it
+SESSION_OWNER_LOCK = "data/sessions.lock"
+
+
+def create_backend(name: str = SESSION_BACKEND):
+    if name == "sqlite":
+        return SqliteSessionBackend()
+    if name == "json":
+        return JsonSessionBackend()
+    raise ValueError(f"Unknown session backend: {name}")
+
+
+# Several server processes (gunicorn or uvicorn --workers) would serve stale sessions and
+# write the same message sequence numbers twice, so a second process fails at import
+def claim_session_state():
+    if SESSION_BACKEND == "sqlite" and SESSION_CACHE_SIZE <= 0:
+        return None
+
+    os.makedirs(os.path.dirname(SESSION_OWNER_LOCK) or ".", exist_ok=True)
+    lock_file = open(SESSION_OWNER_LOCK, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(
+            f"Another process is using the sessions (SESSION_BACKEND={SESSION_BACKEND}, "
+            f"SESSION_CACHE_SIZE={SESSION_CACHE_SIZE}); run several workers with "
+            f"SESSION_BACKEND=sqlite and SESSION_CACHE_SIZE=0"
+        )
+    return lock_file
+
+
+_session_owner = claim_session_state()
+backend = create_backend()
+
+_cache_lock = threading.RLock()
+_session_cache = OrderedDict()
+_pending_messages = {}
+# Messages a running flush has taken from _pending_messages but not yet written
+_flushing = {}
+_flush_lock = threading.Lock()
+_flush_event = threading.Event()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "flushes": 0,
+    "flushed_messages": 0,
+    "flush_seconds_total": 0.0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+}
+
+
+def _copy_session(session: dict):
+    return {**session, "messages": list(session["messages"])}
+
+
+# Insert into the LRU, writing back any evicted session's pending messages
+def _cache_put(session_id: str, session: dict):
+    _session_cache[session_id] = session
+    _session_cache.move_to_end(session_id)
+
+    while len(_session_cache) > max(SESSION_CACHE_SIZE, 1):
+        evicted_id, _ = _session_cache.popitem(last=False)
+        _cache_stats["evictions"] += 1
+
+        entries = _pending_messages.pop(evicted_id, None)
+        if entries:
+            backend.append_messages(evicted_id, entries)
+
+
+def _cached_session(session_id: str):
+    session = _session_cache.get(session_id)
+    if session is not None and SESSION_CACHE_SIZE > 0:
+        _session_cache.move_to_end(session_id)
+        _cache_stats["hits"] += 1
+        return session
+
+    _cache_stats["misses"] += 1
+    session = backend.read_session(session_id)
+    if session is not None:
+        # The backend may not have these yet; seq skips the ones it already has
+        for entry in _flushing.get(session_id, ()):
+            if entry["seq"] >= len(session["messages"]):
+                apply_message(session, entry["role"], entry["text"])
+        _cache_put(session_id, session)
+    return session
+
+
+# Get all sessions except quiz_session; titles of unflushed sessions come from the cache
 def list_sessions():
-    sessions = []
-    files = sorted(os.listdir(SESSIONS_DIR))
+    with _cache_lock:
+        sessions = backend.list_sessions()
 
-    for filename in files:
-        if not filename.endswith(".json"):
-            continue
+        for info in sessions:
+            unflushed = info["session_id"] in _pending_messages or info["session_id"] in _flushing
+            if unflushed and not info.get("title"):
+                cached = _session_cache.get(info["session_id"])
+                if cached is not None:
+                    info["title"] = cached.get("title", "")
 
-        filepath = os.path.join(SESSIONS_DIR, filename)
-        
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            
-            # Skip quiz sessions
-            if data["session_id"] == "quiz_session":
-                continue
+        return sessions
 
-            sessions.append({
-                "session_id": data["session_id"],
-                "created_at": data["created_at"],
-                "title": data.get("title", ""),
-            })
-        except:
-            continue
 
-    return sessions
+# Total user messages across all sessions except quiz_session
+def count_user_messages():
+    with _cache_lock:
+        pending_user_messages = sum(
+            1
+            for unflushed in (_pending_messages, _flushing)
+            for session_id, entries in unflushed.items()
+            if session_id != "quiz_session"
+            for entry in entries
+            if entry["role"] == "user"
+        )
+        return backend.count_user_messages() + pending_user_messages
+
+
+def latest_session_id():
+    flush_sessions()
+    return backend.latest_session_id()
 
 
 # Create new session with auto-generated ID if not provided
 def create_new_session(session_id: str | None = None):
     if session_id is None:
-        files = [f for f in os.listdir(SESSIONS_DIR) if f.endswith(".json")]
-        next_id = len(files) + 1
-        session_id = f"session_{next_id:03d}"
-
-    data = {
-        "session_id": session_id,
-        "created_at": datetime.now().isoformat(),
-        "messages": [],
-        "title": "",
-    }
+        session_id = backend.allocate_session_id()
 
-    path = session_path(session_id)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with _cache_lock:
+        _pending_messages.pop(session_id, None)
+        data = backend.create_session(session_id, datetime.now().isoformat())
+        _cache_put(session_id, data)
 
     return session_id
 
 
 def load_session(session_id: str):
-    filepath = session_path(session_id)
-    
-    if not os.path.exists(filepath):
-        return None
-    
-    with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with _cache_lock:
+        session = _cached_session(session_id)
+        if session is None:
+            return None
+        return _copy_session(session)
+
+
+# Page of a session's messages; uncached sessions are read from the backend without filling the cache
+def load_session_window(session_id: str, limit: int | None = None, before: int | None = None):
+    with _cache_lock:
+        session = _session_cache.get(session_id)
+        if session is not None and SESSION_CACHE_SIZE > 0:
+            _session_cache.move_to_end(session_id)
+            _cache_stats["hits"] += 1
+            return slice_session(session, limit, before)
+
+        _cache_stats["misses"] += 1
+        return backend.read_session_window(session_id, limit, before)
 
-# Add message to session; first user message becomes title
+
+# Add message to the cached session; it is written to the backend on the next flush
 def append_message(session_id: str, role: str, text: str):
-    session = load_session(session_id)
-    if not session:
-        return
+    with _cache_lock:
+        session = _cached_session(session_id)
+        if not session:
+            return
+
+        seq = len(session["messages"])
+        apply_message(session, role, text)
+
+        pending = _pending_messages.setdefault(session_id, [])
+        pending.append({"seq": seq, "role": role, "text": text})
 
-    session["messages"].append({"role": role, "text": text})
+        if SESSION_CACHE_SIZE <= 0:
+            backend.append_messages(session_id, _pending_messages.pop(session_id))
+            _session_cache.pop(session_id, None)
+            return
 
-    if role == "user" and not session.get("title"):
-        cleaned_text = text.strip()
-        if cleaned_text:
-            session["title"] = cleaned_text[:40]
+        dirty_count = sum(len(entries) for entries in _pending_messages.values())
+
+    start_session_flusher()
+    if dirty_count >= FLUSH_DIRTY_THRESHOLD:
+        _flush_event.set()
+
+
+# Write every pending message back to the backend. The cache lock is only held to take the
+# batch, so request threads never wait on backend writes (SQLite or manifest locks).
+def flush_sessions():
+    with _flush_lock:
+        with _cache_lock:
+            if not _pending_messages:
+                return 0
+            _flushing.update(_pending_messages)
+            _pending_messages.clear()
+            batch = list(_flushing.items())
+
+        start = time.perf_counter()
+        flushed = 0
+
+        try:
+            for session_id, entries in batch:
+                backend.append_messages(session_id, entries)
+                flushed += len(entries)
+        finally:
+            with _cache_lock:
+                _flushing.clear()
 
-    filepath = session_path(session_id)
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(session, f, indent=2, ensure_ascii=False)
+        elapsed = time.perf_counter() - start
+        _cache_stats["flushes"] += 1
+        _cache_stats["flushed_messages"] += flushed
+        _cache_stats["flush_seconds_total"] += elapsed
+        _cache_stats["last_flush_ms"] = elapsed * 1000
+        _cache_stats["max_flush_ms"] = max(_cache_stats["max_flush_ms"], elapsed * 1000)
+
+    return flushed
+
+
+def _flusher_loop():
+    while True:
+        _flush_event.wait(FLUSH_INTERVAL_SECONDS)
+        _flush_event.clear()
+        try:
+            flush_sessions()
+        except Exception as e:
+            print(f"Session flush failed: {e}")
+
+
+def start_session_flusher():
+    global _flusher
+
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flusher_loop, name="session-flusher", daemon=True)
+            _flusher.start()
+
+
+# Hit rate and flush latency, for sizing SESSION_CACHE_SIZE
+def session_cache_stats():
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        lookups = stats["hits"] + stats["misses"]
+        flushes = stats.pop("flushes")
+        flush_seconds_total = stats.pop("flush_seconds_total")
+
+        stats["flushes"] = flushes
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["avg_flush_ms"] = flush_seconds_total * 1000 / flushes if flushes else 0.0
+        stats["cached_sessions"] = len(_session_cache)
+        stats["capacity"] = SESSION_CACHE_SIZE
+        stats["pending_messages"] = sum(len(entries) for entries in _pending_messages.values())
+        stats["backend"] = SESSION_BACKEND
+        return stats
 
 
 def delete_session(session_id: str):
-    filepath = session_path(session_id)
-    
-    if not os.path.exists(filepath):
-        return False
-    
-    os.remove(filepath)
-    return True
+    with _cache_lock:
+        _session_cache.pop(session_id, None)
+        _pending_messages.pop(session_id, None)
+        return backend.delete_session(session_id)
+
+
+# Shutdown hook: write back pending messages and release the backend
+def close_sessions():
+    flush_sessions()
+    backend.close()
@@ -1,30 +1,230 @@
-from openai import OpenAI
+import asyncio
+import threading
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from llm_cache import LLMCache, cache_key
+from llm_scheduler import LLMScheduler, INTERACTIVE, BACKGROUND
 
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key="",
-)
+BASE_URL = "https://openrouter.ai/api/v1"
+API_KEY = ""
 
 FAST_MODEL = "x-ai/grok-4.1-fast:free"
 
 SMART_MODEL = "tngtech/deepseek-r1t2-chimera:free"
 
-def call_llm_fast(system_prompt: str, user_message: str) -> str:
+# Per-call deadline in seconds (SMART_MODEL is a reasoning model and needs longer)
+REQUEST_TIMEOUTS = {
+    FAST_MODEL: 20,
+    SMART_MODEL: 120,
+}
+
+# Concurrent upstream requests allowed per model on the async path
+POOL_SIZES = {
+    FAST_MODEL: 32,
+    SMART_MODEL: 16,
+}
+
+MAX_RETRIES = 2
+
+# The sync client relies on the SDK's own timeout and jittered retry
+client = OpenAI(
+  base_url=BASE_URL,
+  api_key=API_KEY,
+  timeout=max(REQUEST_TIMEOUTS.values()),
+  max_retries=MAX_RETRIES,
+)
+
+# One pooled HTTP client with keep-alive, shared by every async call
+async_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=200,
+        max_keepalive_connections=50,
+        keepalive_expiry=30,
+    ),
+)
+
+# Retries on the async path are done by the scheduler, within the call's deadline
+async_client = AsyncOpenAI(
+  base_url=BASE_URL,
+  api_key=API_KEY,
+  http_client=async_http_client,
+  max_retries=0,
+)
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+# Async calls run through per-model pools: interactive work is served before BACKGROUND work
+scheduler = LLMScheduler(POOL_SIZES, REQUEST_TIMEOUTS, max_retries=MAX_RETRIES, is_retryable=_is_retryable)
+
+# Repeated prompts (same model, system prompt and user message) are answered from disk.
+# Pass use_cache=False for calls whose answer should not be reused.
+response_cache = LLMCache()
+
+def build_messages(system_prompt: str, user_message: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+
+# Identical requests already in flight share one upstream call (single-flight)
+_inflight_lock = threading.Lock()
+_inflight = {}
+_inflight_async = {}
+_flight_stats = {"upstream_calls": 0, "coalesced": 0}
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def _request(model: str, system_prompt: str, user_message: str) -> str:
     completion = client.chat.completions.create(
-        model=FAST_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ]
+        model=model,
+        messages=build_messages(system_prompt, user_message),
+        timeout=REQUEST_TIMEOUTS[model]
     )
     return completion.choices[0].message.content
 
-def call_llm(system_prompt: str, user_message: str) -> str:
-    completion = client.chat.completions.create(
-        model=SMART_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ]
+def complete(model: str, system_prompt: str, user_message: str, use_cache: bool = True) -> str:
+    key = cache_key(model, system_prompt, user_message)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _Flight()
+            _inflight[key] = flight
+            _flight_stats["upstream_calls"] += 1
+        else:
+            _flight_stats["coalesced"] += 1
+
+    if not is_leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        content = _request(model, system_prompt, user_message)
+        flight.result = content
+        if use_cache and content:
+            response_cache.put(key, model, content)
+        return content
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+def call_llm_fast(system_prompt: str, user_message: str, use_cache: bool = True) -> str:
+    return complete(FAST_MODEL, system_prompt, user_message, use_cache)
+
+def call_llm(system_prompt: str, user_message: str, use_cache: bool = True) -> str:
+    return complete(SMART_MODEL, system_prompt, user_message, use_cache)
+
+# Async variants: awaiting the LLM does not hold a threadpool worker; cache reads and writes
+# run in a worker thread so SQLite never blocks the event loop
+async def _request_async(model: str, system_prompt: str, user_message: str, key: str, use_cache: bool,
+                         priority: int, timeout: float | None) -> str:
+    completion = await scheduler.run(
+        model,
+        lambda: async_client.chat.completions.create(
+            model=model,
+            messages=build_messages(system_prompt, user_message)
+        ),
+        priority=priority,
+        timeout=timeout,
     )
-    return completion.choices[0].message.content
\ No newline at end of file
+    content = completion.choices[0].message.content
+
+    if use_cache and content:
+        await asyncio.to_thread(response_cache.put, key, model, content)
+    return content
+
+async def complete_async(model: str, system_prompt: str, user_message: str, use_cache: bool = True,
+                         priority: int = INTERACTIVE, timeout: float | None = None) -> str:
+    key = cache_key(model, system_prompt, user_message)
+    if use_cache:
+        cached = await asyncio.to_thread(response_cache.get, key)
+        if cached is not None:
+            return cached
+
+    # The upstream call runs as its own task so one caller cancelling does not fail the others
+    task = _inflight_async.get(key)
+    if task is None:
+        _flight_stats["upstream_calls"] += 1
+        task = asyncio.ensure_future(
+            _request_async(model, system_prompt, user_message, key, use_cache, priority, timeout)
+        )
+        _inflight_async[key] = task
+        task.add_done_callback(lambda _: _inflight_async.pop(key, None))
+    else:
+        _flight_stats["coalesced"] += 1
+
+    return await asyncio.shield(task)
+
+async def call_llm_fast_async(system_prompt: str, user_message: str, use_cache: bool = True,
+                              priority: int = INTERACTIVE, timeout: float | None = None) -> str:
+    return await complete_async(FAST_MODEL, system_prompt, user_message, use_cache, priority, timeout)
+
+async def call_llm_async(system_prompt: str, user_message: str, use_cache: bool = True,
+                         priority: int = INTERACTIVE, timeout: float | None = None) -> str:
+    return await complete_async(SMART_MODEL, system_prompt, user_message, use_cache, priority, timeout)
+
+# Yield the completion text as it arrives from the model; a cache hit is yielded in one piece.
+# The stream holds a pool slot until it finishes, within the model's REQUEST_TIMEOUTS deadline.
+async def stream_llm_async(system_prompt: str, user_message: str, use_cache: bool = True,
+                           model: str = SMART_MODEL, priority: int = INTERACTIVE):
+    key = cache_key(model, system_prompt, user_message)
+    if use_cache:
+        cached = await asyncio.to_thread(response_cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+
+    def open_stream():
+        return async_client.chat.completions.create(
+            model=model,
+            messages=build_messages(system_prompt, user_message),
+            stream=True
+        )
+
+    parts = []
+    async for chunk in scheduler.stream(model, open_stream, priority):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    # Only complete streams are cached
+    if use_cache and parts:
+        await asyncio.to_thread(response_cache.put, key, model, "".join(parts))
+
+def llm_cache_stats() -> dict:
+    return response_cache.get_stats()
+
+# Upstream calls made vs. callers that joined an identical in-flight call
+def llm_flight_stats() -> dict:
+    with _inflight_lock:
+        stats = dict(_flight_stats)
+    stats["in_flight"] = len(_inflight) + len(_inflight_async)
+    return stats
+
+# Per-model pool usage, retries, timeouts, hedges and latency percentiles
+def llm_scheduler_stats() -> dict:
+    return scheduler.get_stats()
+
+# Close pooled connections on server shutdown
+async def close_async_client():
+    await async_client.close()
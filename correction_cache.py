@@ -0,0 +1,184 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Two-level cache of grammar corrections and their explanations: an in-memory LRU in front
+# of SQLite, keyed on the normalized sentence and a fingerprint of the model files
+CORRECTION_CACHE_PATH = "data/correction_cache.db"
+CORRECTION_CACHE_MEMORY_ENTRIES = 4096
+CORRECTION_CACHE_MAX_ENTRIES = 100000
+
+# Past max_entries, the least recently used entries are evicted down to this fraction of it
+EVICT_TO_FRACTION = 0.9
+
+QUOTE_TRANSLATION = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"'})
+
+
+# Whitespace and quote variants map to one key; case and punctuation are kept since T5 output depends on them
+def normalize_sentence(sentence: str) -> str:
+    sentence = unicodedata.normalize("NFC", sentence).translate(QUOTE_TRANSLATION)
+    return re.sub(r"\s+", " ", sentence).strip()
+
+
+# Hash of the name, size and mtime of every file under model_dir, so retraining or re-exporting
+# invalidates the cache without reading gigabytes of weights
+def model_version(model_dir: str) -> str:
+    digest = hashlib.sha256()
+
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, model_dir)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+
+    return digest.hexdigest()[:16]
+
+
+class CorrectionCache:
+    def __init__(self, model_dir: str, path: str = CORRECTION_CACHE_PATH,
+                 memory_entries: int = CORRECTION_CACHE_MEMORY_ENTRIES,
+                 max_entries: int = CORRECTION_CACHE_MAX_ENTRIES):
+        self.model_dir = model_dir
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._conn = None
+        # Upper bound on the row count (updates also count), recounted only past max_entries
+        self._entries = 0
+
+    # Fingerprinting the model and opening the database wait until warm_up or the first lookup
+    def _ready(self):
+        if self._conn is not None:
+            return
+
+        self._version = model_version(self.model_dir)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS corrections ("
+            "key TEXT PRIMARY KEY, model_version TEXT NOT NULL, sentence TEXT NOT NULL, "
+            "corrected TEXT NOT NULL, explanation TEXT, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_corrections_last_used ON corrections (last_used)")
+
+        # Entries from a previous model are never valid again
+        conn.execute("DELETE FROM corrections WHERE model_version != ?", (self._version,))
+        conn.commit()
+        self._entries = conn.execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+        self._conn = conn
+
+    def warm_up(self):
+        with self._lock:
+            self._ready()
+
+    def _key(self, sentence: str) -> str:
+        payload = f"{self._version}\n{normalize_sentence(sentence)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, entry: dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # {"corrected": ..., "explanation": ... or None}, or None if the sentence was never corrected
+    def get(self, sentence: str):
+        with self._lock:
+            self._ready()
+            key = self._key(sentence)
+
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return dict(entry)
+
+            row = self._conn.execute(
+                "SELECT corrected, explanation FROM corrections WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE corrections SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+            entry = {"corrected": row[0], "explanation": row[1]}
+            self._remember(key, entry)
+            self.stats["disk_hits"] += 1
+            return dict(entry)
+
+    def put_correction(self, sentence: str, corrected: str):
+        with self._lock:
+            self._ready()
+            key = self._key(sentence)
+
+            self._conn.execute(
+                "INSERT INTO corrections (key, model_version, sentence, corrected, explanation, last_used) "
+                "VALUES (?, ?, ?, ?, NULL, ?) "
+                "ON CONFLICT(key) DO UPDATE SET corrected = excluded.corrected, last_used = excluded.last_used",
+                (key, self._version, normalize_sentence(sentence), corrected, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+            previous = self._memory.get(key) or {}
+            self._remember(key, {"corrected": corrected, "explanation": previous.get("explanation")})
+            self.stats["stores"] += 1
+
+    # Explanations are only stored for sentences whose correction is already cached
+    def put_explanation(self, sentence: str, explanation: str):
+        with self._lock:
+            self._ready()
+            key = self._key(sentence)
+
+            self._conn.execute(
+                "UPDATE corrections SET explanation = ?, last_used = ? WHERE key = ?",
+                (explanation, time.time(), key),
+            )
+            self._conn.commit()
+
+            entry = self._memory.get(key)
+            if entry is not None:
+                entry["explanation"] = explanation
+
+    def _evict(self):
+        self._entries += 1
+        if self._entries <= self.max_entries:
+            return
+
+        count = self._conn.execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+        overflow = count - int(self.max_entries * EVICT_TO_FRACTION) if count > self.max_entries else 0
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM corrections WHERE key IN "
+                "(SELECT key FROM corrections ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+            self.stats["evictions"] += overflow
+        self._entries = count - overflow
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["model_version"] = self._version
+            if self._conn is not None:
+                stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,109 @@
+import json
+import argparse
+from datasets import load_from_disk
+
+from grammar_inference import (
+    GRAMMAR_BACKEND,
+    PRECHECK_MIN_CONFIDENCE,
+    generate_corrections,
+    greedy_outputs,
+    load_backend,
+    precheck_decisions,
+)
+
+# Precision/recall of the "already correct" skip decision on the held-out pairs.
+# A pair counts as correct when its reference target equals the source; with --against-model
+# the 4-beam output of the same model is the reference instead (what skipping actually changes).
+
+TEST_DATA_DIR = "data/grammar_correction_pairs"
+REPORT_PATH = "models/precheck_report.json"
+DEFAULT_THRESHOLDS = [0.5, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98]
+
+
+def _same(a: str, b: str) -> bool:
+    return " ".join(a.split()) == " ".join(b.split())
+
+
+def score(decisions: list, labels: list) -> dict:
+    true_positive = sum(1 for d, l in zip(decisions, labels) if d and l)
+    skipped = sum(decisions)
+    correct = sum(labels)
+
+    precision = true_positive / skipped if skipped else None
+    recall = true_positive / correct if correct else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+
+    return {
+        "skip_rate": skipped / len(decisions),
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        # Erroneous sentences that would get the "no errors" reply
+        "missed_errors": skipped - true_positive,
+    }
+
+
+def evaluate(count: int, thresholds: list, against_model: bool, batch_size: int = 16,
+             data_dir: str = TEST_DATA_DIR, backend: str = GRAMMAR_BACKEND):
+    test = load_from_disk(data_dir)["test"]
+    count = min(count, len(test))
+    sources = test["source"][:count]
+    targets = test["target"][:count]
+
+    tokenizer, model = load_backend(backend)
+
+    outputs = []
+    references = []
+    for start in range(0, count, batch_size):
+        batch = sources[start:start + batch_size]
+        outputs.extend(greedy_outputs(tokenizer, model, batch))
+        if against_model:
+            references.extend(generate_corrections(tokenizer, model, batch))
+
+    if not against_model:
+        references = targets
+
+    labels = [_same(source, reference) for source, reference in zip(sources, references)]
+
+    report = {
+        "examples": count,
+        "backend": backend,
+        "reference": "model" if against_model else "dataset",
+        "already_correct_share": sum(labels) / count,
+        "thresholds": {},
+    }
+    for threshold in thresholds:
+        report["thresholds"][str(threshold)] = score(precheck_decisions(outputs, sources, threshold), labels)
+
+    return report
+
+
+def print_report(report: dict):
+    print(f"{report['examples']} held-out pairs ({report['backend']}, reference: {report['reference']}), "
+          f"{report['already_correct_share']:.1%} already correct")
+
+    for threshold, result in report["thresholds"].items():
+        precision = f"{result['precision']:.3f}" if result["precision"] is not None else "  -  "
+        recall = f"{result['recall']:.3f}" if result["recall"] is not None else "  -  "
+        marker = "  <- current" if float(threshold) == PRECHECK_MIN_CONFIDENCE else ""
+        print(f"  min confidence {float(threshold):.2f}: skip {result['skip_rate']:6.1%}   "
+              f"precision {precision}   recall {recall}   missed errors {result['missed_errors']}{marker}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the already-correct pre-check on held-out pairs")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--against-model", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--data-dir", default=TEST_DATA_DIR)
+    parser.add_argument("--report", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    thresholds = sorted(set(args.thresholds) | {PRECHECK_MIN_CONFIDENCE})
+    report = evaluate(args.count, thresholds, args.against_model, args.batch_size, args.data_dir)
+    print_report(report)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved report to {args.report}")
@@ -1,4 +1,5 @@
 const API_BASE = "http://localhost:8000";
+const PAGE_SIZE = 50;
 
 let sessionId = null;
 let sessions = [];
@@ -6,6 +7,7 @@ let currentMode = "chat";
 let quizState = null;
 let quizCompleted = false;
 let quizGenerating = false;
+let oldestMessageIndex = 0;
 
 async function ensureSession() {
     const res = await fetch(`${API_BASE}/sessions/new`, { method: "POST" });
@@ -62,15 +64,52 @@ function renderSessionList() {
 async function openSession(id) {
     if (!id) return;
     sessionId = id;
-    const res = await fetch(`${API_BASE}/sessions/${id}`);
+    const res = await fetch(`${API_BASE}/sessions/${id}?limit=${PAGE_SIZE}`);
     const data = await res.json();
     const box = document.getElementById("chat-box");
     box.innerHTML = "";
     const msgs = data.messages || [];
     msgs.forEach(m => addMessage(m.text, m.role));
+    setOlderMessagesButton(data);
     renderSessionList();
 }
 
+function setOlderMessagesButton(data) {
+    const box = document.getElementById("chat-box");
+    const existing = document.getElementById("load-older-btn");
+    if (existing) existing.remove();
+
+    oldestMessageIndex = data.first_index || 0;
+    if (!data.has_more) return;
+
+    const btn = document.createElement("button");
+    btn.id = "load-older-btn";
+    btn.classList.add("load-older-btn");
+    btn.innerText = "Load earlier messages";
+    btn.onclick = loadOlderMessages;
+    box.insertBefore(btn, box.firstChild);
+}
+
+async function loadOlderMessages() {
+    const id = sessionId;
+    const res = await fetch(`${API_BASE}/sessions/${id}?limit=${PAGE_SIZE}&before=${oldestMessageIndex}`);
+    const data = await res.json();
+    if (id !== sessionId) return;
+
+    const box = document.getElementById("chat-box");
+    const btn = document.getElementById("load-older-btn");
+    const anchor = btn ? btn.nextSibling : box.firstChild;
+    const previousHeight = box.scrollHeight;
+
+    (data.messages || []).forEach(m => {
+        box.insertBefore(createMessageElement(m.text, m.role), anchor);
+    });
+    setOlderMessagesButton(data);
+
+    // Keep the message the user was looking at in place
+    box.scrollTop += box.scrollHeight - previousHeight;
+}
+
 async function newChat() {
     const res = await fetch(`${API_BASE}/sessions/new`, { method: "POST" });
     const data = await res.json();
@@ -99,12 +138,47 @@ async function deleteSession(id) {
     }
 }
 
-function addMessage(text, sender) {
-    const box = document.getElementById("chat-box");
+function createMessageElement(text, sender) {
     const msg = document.createElement("div");
     msg.classList.add("message", sender);
     msg.innerText = text;
-    box.appendChild(msg);
+    return msg;
+}
+
+// Original sentence with each edit marked: removed text struck through, inserted text highlighted
+function createEditsElement(result) {
+    const view = document.createElement("div");
+    view.classList.add("edit-highlight");
+
+    let position = 0;
+    result.edits.forEach(edit => {
+        const [start, end] = edit.original_span;
+        view.appendChild(document.createTextNode(result.original.slice(position, start)));
+
+        const title = edit.topic ? edit.topic : "other";
+        if (edit.original) {
+            const removed = document.createElement("del");
+            removed.textContent = edit.original;
+            removed.title = title;
+            view.appendChild(removed);
+        }
+        if (edit.corrected) {
+            if (edit.original) view.appendChild(document.createTextNode(" "));
+            const inserted = document.createElement("ins");
+            inserted.textContent = edit.corrected;
+            inserted.title = title;
+            view.appendChild(inserted);
+            if (!edit.original && start < result.original.length) view.appendChild(document.createTextNode(" "));
+        }
+        position = end;
+    });
+    view.appendChild(document.createTextNode(result.original.slice(position)));
+    return view;
+}
+
+function addMessage(text, sender) {
+    const box = document.getElementById("chat-box");
+    box.appendChild(createMessageElement(text, sender));
     box.scrollTop = box.scrollHeight;
 }
 
@@ -137,15 +211,86 @@ async function sendMessage() {
     input.value = "";
     showLoadingBubble();
 
-    const res = await fetch(`${API_BASE}/chat`, {
+    const res = await fetch(`${API_BASE}/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ session_id: sessionId, message: text })
     });
 
-    const data = await res.json();
+    if (!(res.headers.get("Content-Type") || "").startsWith("text/event-stream")) {
+        const data = await res.json();
+        removeLoadingBubble();
+        addMessage(data.response || data.error, "assistant");
+        return;
+    }
+
+    // Render the reply incrementally as server-sent events arrive
+    const box = document.getElementById("chat-box");
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let reply = "";
+    let bubble = null;
+    let bubbleText = null;
+    let draftCorrection = "";
+    const correctedSentences = [];
+
+    const ensureBubble = () => {
+        if (!bubble) {
+            removeLoadingBubble();
+            bubble = createMessageElement("", "assistant");
+            bubbleText = document.createElement("div");
+            bubble.appendChild(bubbleText);
+            box.appendChild(bubble);
+        }
+    };
+
+    const showReply = value => {
+        ensureBubble();
+        bubbleText.innerText = value;
+        box.scrollTop = box.scrollHeight;
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+
+        events.forEach(event => {
+            if (!event.startsWith("data: ")) return;
+            const data = JSON.parse(event.slice(6));
+            if (data.correction_delta) {
+                // Draft correction, token by token, until the explanation starts
+                draftCorrection += data.correction_delta;
+                if (!reply) showReply(`Corrected: ${draftCorrection}…`);
+            } else if (data.edits) {
+                // Single sentence: highlight the edits above the explanation
+                if (data.edits.edits.length) {
+                    ensureBubble();
+                    bubble.insertBefore(createEditsElement(data.edits), bubbleText);
+                    box.scrollTop = box.scrollHeight;
+                }
+                if (!reply && draftCorrection) showReply(`Corrected: ${data.edits.corrected}`);
+            } else if (data.sentence) {
+                // Document mode: show each corrected sentence as soon as its batch is done
+                const { index, total, corrected } = data.sentence;
+                correctedSentences[index] = corrected;
+                const done = correctedSentences.filter(Boolean).length;
+                const draft = Array.from({ length: total }, (_, i) => correctedSentences[i] || "…").join(" ");
+                showReply(`Correcting ${done}/${total} sentences…\n\n${draft}`);
+            } else if (data.delta) {
+                reply += data.delta;
+                showReply(reply);
+            } else if (data.error) {
+                showReply(reply ? `${reply}\n\n${data.error}` : data.error);
+            }
+        });
+    }
+
     removeLoadingBubble();
-    addMessage(data.response, "assistant");
     loadSessions();
 }
 
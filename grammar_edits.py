@@ -0,0 +1,375 @@
+import re
+import difflib
+
+# Token-level edits between a sentence and its correction, classified into the quiz topics
+# (quiz.TOPICS) and explained from templates, so most corrections need no explanation LLM call
+
+TOPIC_NAMES = {
+    "article": "Article",
+    "sva": "Subject-verb agreement",
+    "tense": "Verb tense",
+    "preposition": "Preposition",
+    "comparative": "Comparative",
+    "wh": "Question word",
+}
+
+ARTICLES = {"a", "an", "the"}
+PREPOSITIONS = {
+    "in", "on", "at", "to", "for", "from", "with", "by", "of", "about", "into", "onto",
+    "over", "under", "between", "during", "since", "until", "through", "towards", "toward",
+}
+WH_WORDS = {"who", "whom", "whose", "what", "which", "where", "when", "why", "how"}
+DEGREE_WORDS = {"more", "most", "less", "least"}
+SUBJECT_PRONOUNS = {"i", "you", "he", "she", "it", "we", "they", "this", "that", "there"}
+
+# Agreement pairs that differ only in person/number
+AGREEMENT_FORMS = [
+    {"am", "is", "are"},
+    {"was", "were"},
+    {"has", "have"},
+    {"does", "do"},
+    {"doesn't", "don't"},
+    {"isn't", "aren't"},
+    {"wasn't", "weren't"},
+    {"hasn't", "haven't"},
+]
+
+AUXILIARIES = {"will", "would", "did", "does", "do", "had", "has", "have", "was", "were", "is", "are", "am", "be", "been"}
+
+# base, past, past participle
+IRREGULAR_VERBS = [
+    ("be", "was", "been"), ("become", "became", "become"), ("begin", "began", "begun"),
+    ("break", "broke", "broken"), ("bring", "brought", "brought"), ("build", "built", "built"),
+    ("buy", "bought", "bought"), ("catch", "caught", "caught"), ("choose", "chose", "chosen"),
+    ("come", "came", "come"), ("do", "did", "done"), ("drink", "drank", "drunk"),
+    ("drive", "drove", "driven"), ("eat", "ate", "eaten"), ("fall", "fell", "fallen"),
+    ("feel", "felt", "felt"), ("find", "found", "found"), ("fly", "flew", "flown"),
+    ("forget", "forgot", "forgotten"), ("get", "got", "gotten"), ("give", "gave", "given"),
+    ("go", "went", "gone"), ("have", "had", "had"), ("hear", "heard", "heard"),
+    ("keep", "kept", "kept"), ("know", "knew", "known"), ("leave", "left", "left"),
+    ("lose", "lost", "lost"), ("make", "made", "made"), ("meet", "met", "met"),
+    ("pay", "paid", "paid"), ("run", "ran", "run"), ("say", "said", "said"),
+    ("see", "saw", "seen"), ("sell", "sold", "sold"), ("send", "sent", "sent"),
+    ("sing", "sang", "sung"), ("sit", "sat", "sat"), ("sleep", "slept", "slept"),
+    ("speak", "spoke", "spoken"), ("spend", "spent", "spent"), ("stand", "stood", "stood"),
+    ("swim", "swam", "swum"), ("take", "took", "taken"), ("teach", "taught", "taught"),
+    ("tell", "told", "told"), ("think", "thought", "thought"), ("understand", "understood", "understood"),
+    ("wake", "woke", "woken"), ("wear", "wore", "worn"), ("win", "won", "won"), ("write", "wrote", "written"),
+]
+
+VERB_FORMS = {}
+for forms in IRREGULAR_VERBS:
+    for form in forms:
+        VERB_FORMS.setdefault(form, set()).update(forms)
+    # Third-person singular belongs to the same verb
+    base = forms[0]
+    third_person = {"be": "is", "have": "has", "do": "does", "go": "goes"}.get(base, base + "s")
+    VERB_FORMS.setdefault(third_person, set()).update(forms)
+    for form in forms:
+        VERB_FORMS[form].add(third_person)
+
+# Adjectives whose comparison is recognised; anything else is left to the explanation LLM
+COMPARATIVE_ADJECTIVES = {
+    "big", "small", "tall", "short", "long", "old", "young", "new", "fast", "slow", "hot", "cold",
+    "warm", "cool", "high", "low", "large", "nice", "fine", "late", "early", "easy", "busy", "happy",
+    "sad", "heavy", "light", "dark", "bright", "cheap", "rich", "poor", "strong", "weak", "hard",
+    "soft", "clean", "dirty", "quiet", "loud", "near", "close", "wide", "thin", "fat", "smart",
+    "kind", "safe", "simple", "pretty", "funny", "lazy", "angry", "friendly", "healthy", "lucky",
+    "beautiful", "expensive", "interesting", "important", "difficult", "comfortable", "famous",
+    "popular", "dangerous", "careful", "intelligent", "useful", "boring", "exciting", "delicious",
+}
+IRREGULAR_COMPARATIVES = {
+    "good": ("better", "best"),
+    "bad": ("worse", "worst"),
+    "far": ("farther", "farthest", "further", "furthest"),
+}
+
+
+# Regular -er/-est forms of an adjective, including the wrong ones learners write ("gooder", "beautifulest")
+def _comparison_forms(base: str):
+    forms = {base + "er", base + "est"}
+    if base.endswith("e"):
+        forms |= {base + "r", base + "st"}
+    if base.endswith("y"):
+        forms |= {base[:-1] + "ier", base[:-1] + "iest"}
+    if re.fullmatch(r"[^aeiou]*[aeiou][^aeiouwy]", base):
+        forms |= {base + base[-1] + "er", base + base[-1] + "est"}
+    return forms
+
+
+# Every form of a known adjective -> its base
+ADJECTIVE_FORMS = {}
+for adjective in COMPARATIVE_ADJECTIVES | set(IRREGULAR_COMPARATIVES):
+    for form in {adjective} | _comparison_forms(adjective) | set(IRREGULAR_COMPARATIVES.get(adjective, ())):
+        ADJECTIVE_FORMS[form] = adjective
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)?|[^\w\s]")
+
+
+# Tokens with their character offsets, so edits can be highlighted in the original text
+def tokenize(text: str):
+    return [(match.group(), match.start(), match.end()) for match in TOKEN_PATTERN.finditer(text)]
+
+
+def _span(tokens, start: int, end: int, text_length: int):
+    if start < end:
+        return [tokens[start][1], tokens[end - 1][2]]
+    # Zero-width span at the insertion point
+    position = tokens[start][1] if start < len(tokens) else text_length
+    return [position, position]
+
+
+def _strip_s(word: str):
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("es") and word[:-2].endswith(("s", "x", "z", "ch", "sh", "o")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def _strip_ed(word: str):
+    if word.endswith("ied"):
+        return word[:-3] + "y"
+    if word.endswith("ed"):
+        stem = word[:-2]
+        if len(stem) > 2 and stem[-1] == stem[-2]:
+            return stem[:-1]
+        return stem
+    return word
+
+
+def _stems(word: str):
+    return {word, _strip_ed(word), _strip_s(word)}
+
+
+def _same_verb(a: str, b: str):
+    a_stems, b_stems = _stems(a), _stems(b)
+    if a_stems & b_stems:
+        return True
+    return any(b in VERB_FORMS.get(stem, ()) or a in VERB_FORMS.get(other, ())
+               for stem in a_stems for other in b_stems)
+
+
+def _related(a: str, b: str):
+    if a in WH_WORDS and b in WH_WORDS:
+        return True
+    if _same_verb(a, b) or _is_agreement_pair(a, b):
+        return True
+    return difflib.SequenceMatcher(None, a, b).ratio() >= 0.6
+
+
+# Split an uneven replace ("have car" -> "has a car") into one-word replaces plus an insert or delete
+def split_replace(i1: int, i2: int, j1: int, j2: int, original_words: list, corrected_words: list):
+    if i2 - i1 == j2 - j1:
+        return [("replace", i1, i2, j1, j2)]
+
+    rest = "delete" if i2 - i1 > j2 - j1 else "insert"
+    both_longer = i2 - i1 > 1 and j2 - j1 > 1
+
+    if _related(original_words[i1], corrected_words[j1]):
+        head = [("replace", i1, i1 + 1, j1, j1 + 1)]
+        if both_longer:
+            return head + split_replace(i1 + 1, i2, j1 + 1, j2, original_words, corrected_words)
+        return head + [(rest, i1 + 1, i2, j1 + 1, j2)]
+
+    if _related(original_words[i2 - 1], corrected_words[j2 - 1]):
+        tail = [("replace", i2 - 1, i2, j2 - 1, j2)]
+        if both_longer:
+            return split_replace(i1, i2 - 1, j1, j2 - 1, original_words, corrected_words) + tail
+        return [(rest, i1, i2 - 1, j1, j2 - 1)] + tail
+
+    return [("replace", i1, i2, j1, j2)]
+
+
+def _is_agreement_pair(a: str, b: str):
+    if any(a in forms and b in forms for forms in AGREEMENT_FORMS):
+        return True
+    return a != b and (_strip_s(a) == b or _strip_s(b) == a)
+
+
+# The same known adjective on both sides, changing form or gaining/losing more/most,
+# or more/most changed right before a known adjective (next_words: the words after the edit)
+def _is_comparative_pair(a: list, b: list, next_words: set = frozenset()):
+    # "bigger then" -> "bigger than"
+    changed = set(a) ^ set(b)
+    if "than" in changed and changed <= {"than", "then", "that"}:
+        return True
+
+    # "big" -> "bigger", "more big" -> "bigger", "gooder" -> "better"
+    bases = {ADJECTIVE_FORMS[word] for word in a if word in ADJECTIVE_FORMS}
+    bases &= {ADJECTIVE_FORMS[word] for word in b if word in ADJECTIVE_FORMS}
+    if bases:
+        return any(word in ADJECTIVE_FORMS or word in DEGREE_WORDS for word in changed)
+
+    # "more big" -> "big", "the more beautiful" -> "the most beautiful"
+    return bool(changed) and changed <= DEGREE_WORDS and any(word in ADJECTIVE_FORMS for word in next_words)
+
+
+def classify_edit(original_words: list, corrected_words: list, previous_word: str | None,
+                  next_words: set = frozenset()):
+    words = set(original_words) | set(corrected_words)
+
+    if words and words <= ARTICLES:
+        return "article"
+    if words and words <= WH_WORDS:
+        return "wh"
+    if words and words <= PREPOSITIONS:
+        return "preposition"
+
+    if len(original_words) == 1 and len(corrected_words) == 1:
+        before, after = original_words[0], corrected_words[0]
+
+        if _is_agreement_pair(before, after) and (previous_word in SUBJECT_PRONOUNS or before in AUXILIARIES):
+            return "sva"
+        if _same_verb(before, after) and not _is_agreement_pair(before, after):
+            return "tense"
+
+    # Auxiliary changes such as "go" -> "will go" or "did went" -> "went"
+    if words & AUXILIARIES and (set(original_words) & set(corrected_words) or
+                                any(_same_verb(a, b) for a in original_words for b in corrected_words)):
+        return "tense"
+
+    if _is_comparative_pair(original_words, corrected_words, next_words):
+        return "comparative"
+
+    return None
+
+
+# Edits as JSON-friendly dicts: kind, original/corrected text, character spans in each sentence, topic
+def extract_edits(original: str, corrected: str) -> list:
+    original_tokens = tokenize(original)
+    corrected_tokens = tokenize(corrected)
+
+    original_words = [token[0].lower() for token in original_tokens]
+    corrected_words = [token[0].lower() for token in corrected_tokens]
+
+    edits = []
+    matcher = difflib.SequenceMatcher(None, original_words, corrected_words, autojunk=False)
+
+    opcodes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "replace":
+            opcodes.extend(split_replace(i1, i2, j1, j2, original_words, corrected_words))
+        elif tag != "equal":
+            opcodes.append((tag, i1, i2, j1, j2))
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        original_span = _span(original_tokens, i1, i2, len(original))
+        corrected_span = _span(corrected_tokens, j1, j2, len(corrected))
+        previous_word = original_words[i1 - 1] if i1 > 0 else None
+        next_words = set(original_words[i2:i2 + 1] + corrected_words[j2:j2 + 1])
+
+        edits.append({
+            "kind": tag,
+            "original": original[original_span[0]:original_span[1]],
+            "corrected": corrected[corrected_span[0]:corrected_span[1]],
+            "original_span": original_span,
+            "corrected_span": corrected_span,
+            "topic": classify_edit(original_words[i1:i2], corrected_words[j1:j2], previous_word, next_words),
+        })
+
+    # Capitalisation changes inside otherwise equal words
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            continue
+        for offset in range(i2 - i1):
+            before, after = original_tokens[i1 + offset], corrected_tokens[j1 + offset]
+            if before[0] != after[0]:
+                edits.append({
+                    "kind": "replace",
+                    "original": before[0],
+                    "corrected": after[0],
+                    "original_span": [before[1], before[2]],
+                    "corrected_span": [after[1], after[2]],
+                    "topic": "punctuation",
+                })
+    edits.sort(key=lambda edit: edit["original_span"])
+
+    # Edits that only touch punctuation get no quiz topic but need no LLM either
+    for edit in edits:
+        if edit["topic"] is None and not re.search(r"\w", edit["original"] + edit["corrected"]):
+            edit["topic"] = "punctuation"
+
+    return edits
+
+
+TEMPLATES = {
+    "article": (
+        "The article is wrong or missing.",
+        "English nouns usually need the right article: \"a\" before consonant sounds, \"an\" before vowel sounds, "
+        "and \"the\" for something specific.",
+        "Use a/an for one non-specific thing (an apple), the for a specific or known thing.",
+    ),
+    "sva": (
+        "The verb does not agree with its subject.",
+        "A singular subject (he, she, it) needs a singular verb, and a plural subject needs a plural verb.",
+        "he/she/it + verb-s (goes, has, is); I/you/we/they + base form (go, have, are).",
+    ),
+    "tense": (
+        "The verb is in the wrong tense or form.",
+        "The verb form has to match the time of the action and the auxiliary before it.",
+        "Past actions use the past form (went); after did/will/can use the base form; after have/has use the past participle.",
+    ),
+    "preposition": (
+        "The wrong preposition is used.",
+        "Prepositions depend on the word and the meaning (time, place, direction) and are often fixed by usage.",
+        "Learn common pairs: at + time, on + day, in + month/year/place, to + destination.",
+    ),
+    "comparative": (
+        "The comparative or superlative form is wrong.",
+        "Short adjectives add -er/-est, longer ones use more/most, and \"more\" is never combined with -er.",
+        "bigger than / the biggest; more interesting than / the most interesting.",
+    ),
+    "wh": (
+        "The wrong question word is used.",
+        "Each question word asks about a different thing: who (person), what (thing), where (place), "
+        "when (time), why (reason), how (manner).",
+        "Choose the question word that matches the information you are asking for.",
+    ),
+    "punctuation": (
+        "Punctuation or capitalisation is missing or wrong.",
+        "Sentences start with a capital letter and end with a full stop, question mark or exclamation mark.",
+        "Capitalise the first word and I; end every sentence with punctuation.",
+    ),
+}
+
+
+def describe_edit(edit: dict) -> str:
+    if edit["kind"] == "insert":
+        return f"add \"{edit['corrected']}\""
+    if edit["kind"] == "delete":
+        return f"remove \"{edit['original']}\""
+    return f"\"{edit['original']}\" → \"{edit['corrected']}\""
+
+
+# One section per topic; "more tall" -> "taller" is two edits but one explanation
+def render_topic(number: int, topic: str, edits: list) -> str:
+    error_type, why_wrong, rule = TEMPLATES[topic]
+    name = TOPIC_NAMES.get(topic, "Punctuation")
+    changes = ", ".join(describe_edit(edit) for edit in edits)
+    return (
+        f"Edit {number}: {changes}\n"
+        f"1. Error Type: {name}. {error_type}\n"
+        f"2. Why wrong: {why_wrong}\n"
+        f"3. Correct Rule: {rule}"
+    )
+
+
+def explanation_header(original: str, corrected: str) -> str:
+    return f"Original: {original}\nCorrected: {corrected}\n\nExplanation:\n"
+
+
+# Templated explanation of the classified edits, the number of sections used,
+# and the edits left for the LLM
+def render_explanation(original: str, corrected: str, edits: list):
+    by_topic = {}
+    for edit in edits:
+        if edit["topic"]:
+            by_topic.setdefault(edit["topic"], []).append(edit)
+    unclassified = [edit for edit in edits if not edit["topic"]]
+
+    sections = [render_topic(number, topic, group) for number, (topic, group) in enumerate(by_topic.items(), start=1)]
+    text = explanation_header(original, corrected) + "\n\n".join(sections)
+    return text, len(sections), unclassified
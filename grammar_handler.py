@@ -1,5 +1,10 @@
 import re
-from grammar_inference import correct_grammar
+import asyncio
+from grammar_inference import correct_grammar, correct_document, correction_cache
+from grammar_inference import cached_corrections, correct_and_cache_batch, likely_correct
+from grammar_inference import grammar_streaming_enabled, likely_correct_streaming
+from grammar_inference import split_sentences, join_sentences, length_sorted_batches
+from grammar_edits import extract_edits, render_explanation, describe_edit
 from client import call_llm
 
 # Prompt that enforces structured grammar explanation format
@@ -17,6 +22,33 @@ Explanation:
 No extra notes/examples.
 """
 
+# Prompt for texts of several sentences; only the sentences the model changed are sent
+SYSTEM_PROMPT_GRAMMAR_DOCUMENT = """
+You are a grammar tutor reviewing a learner's text. For each numbered sentence, follow this EXACT format:
+
+Sentence <n>:
+Original: <original sentence>
+Corrected: <corrected sentence>
+Error: <error type and the rule, 1-2 sentences>
+
+No extra notes/examples.
+"""
+
+NO_DOCUMENT_ERRORS_REPLY = "I didn't find any grammar errors in your text."
+
+# Prompt for the edits grammar_edits has no template for; the others are already explained
+SYSTEM_PROMPT_GRAMMAR_EDITS = """
+You are a grammar tutor. Explain ONLY the listed changes between the two sentences.
+For each change, follow this EXACT format, numbering from the given start:
+
+Edit <n>: <change>
+1. Error Type: <1 sentence>
+2. Why wrong: <1-2 sentences>
+3. Correct Rule: <short rule>
+
+No extra notes/examples.
+"""
+
 # Regex patterns to detect grammar correction requests
 GRAMMAR_PATTERNS = [
     r"correct the grammar[: ]+(.+)",
@@ -35,12 +67,13 @@ GRAMMAR_PATTERNS = [
 def extract_grammar_target(user_input: str) -> str:
     text = user_input.strip()
 
-    quoted = re.search(r'["\'](.+?)["\']', text)
+    # Quotes must not touch a letter on the outside, so apostrophes in "don't" are not quotes
+    quoted = re.search(r'(?<!\w)["\'](.+?)["\'](?!\w)', text, flags=re.DOTALL)
     if quoted:
         return quoted.group(1).strip()
 
     for pattern in GRAMMAR_PATTERNS:
-        match = re.search(pattern, text, flags=re.IGNORECASE)
+        match = re.search(pattern, text, flags=re.IGNORECASE | re.DOTALL)
         if match:
             sentence = match.group(1).strip()
             if sentence:
@@ -48,14 +81,88 @@ def extract_grammar_target(user_input: str) -> str:
     
     return text
 
+def build_grammar_prompt(original_sentence: str, corrected: str) -> str:
+    return f"Original: {original_sentence}\nCorrected: {corrected}"
+
+def is_document(text: str) -> bool:
+    return len(split_sentences(text)[0]) > 1
+
+# Numbered original/corrected pairs for the sentences the model changed, or None if none changed
+def build_document_prompt(sentences: list, corrected: list):
+    lines = []
+    for number, (original, fixed) in enumerate(zip(sentences, corrected), start=1):
+        if original.strip() != fixed.strip():
+            lines.append(f"{number}. Original: {original}\n   Corrected: {fixed}")
+    return "\n".join(lines) if lines else None
+
+def document_preamble(corrected_text: str) -> str:
+    return f"Corrected text:\n{corrected_text}\n\n"
+
+# Correct a multi-sentence text sentence by sentence and explain the changes
+def handle_document(text: str) -> str:
+    sentences, separators = split_sentences(text)
+    corrected = correct_document(sentences)
+
+    preamble = document_preamble(join_sentences(corrected, separators))
+    prompt = build_document_prompt(sentences, corrected)
+    if prompt is None:
+        return preamble + NO_DOCUMENT_ERRORS_REPLY
+    return preamble + call_llm(SYSTEM_PROMPT_GRAMMAR_DOCUMENT, prompt)
+
+def remember_explanation(sentence: str, explanation: str):
+    if explanation.strip():
+        correction_cache.put_explanation(sentence, explanation)
+
+def no_errors_reply(sentence: str) -> str:
+    return f"Original: {sentence}\nCorrected: {sentence}\n\nNo grammar errors found. This sentence is already correct."
+
+def build_edits_prompt(original_sentence: str, corrected: str, edits: list, start_number: int) -> str:
+    changes = "\n".join(f"- {describe_edit(edit)}" for edit in edits)
+    return (
+        f"Original: {original_sentence}\nCorrected: {corrected}\n"
+        f"Start numbering at: {start_number}\nChanges to explain:\n{changes}"
+    )
+
+# Explanation from templates when every edit is classified; otherwise
+# (system prompt, user prompt, preamble) so the LLM explains only the remaining edits
+def plan_explanation(original_sentence: str, corrected: str, edits: list):
+    if not edits:
+        return no_errors_reply(original_sentence)
+
+    text, sections, unclassified = render_explanation(original_sentence, corrected, edits)
+    if not unclassified:
+        return text
+    if sections == 0:
+        return SYSTEM_PROMPT_GRAMMAR, build_grammar_prompt(original_sentence, corrected), ""
+    return (
+        SYSTEM_PROMPT_GRAMMAR_EDITS,
+        build_edits_prompt(original_sentence, corrected, unclassified, sections + 1),
+        text + "\n\n",
+    )
+
 # Correct sentence using model and generate explanation
 def handle_grammar_core(original_sentence: str) -> str:
-    corrected = correct_grammar(original_sentence)
+    if is_document(original_sentence):
+        return handle_document(original_sentence)
 
-    return call_llm(
-        SYSTEM_PROMPT_GRAMMAR,
-        f"Original: {original_sentence}\nCorrected: {corrected}",
-    )
+    cached = correction_cache.get(original_sentence)
+    if cached is not None and cached["explanation"]:
+        return cached["explanation"]
+
+    if cached is None and likely_correct(original_sentence):
+        corrected = original_sentence
+        correction_cache.put_correction(original_sentence, corrected)
+    else:
+        corrected = correct_grammar(original_sentence)
+
+    plan = plan_explanation(original_sentence, corrected, extract_edits(original_sentence, corrected))
+    if isinstance(plan, str):
+        return plan
+
+    system_prompt, user_prompt, preamble = plan
+    explanation = preamble + call_llm(system_prompt, user_prompt)
+    remember_explanation(original_sentence, explanation)
+    return explanation
 
 
 def handle_grammar(user_input: str) -> str:
@@ -67,3 +174,88 @@ def handle_grammar_with_target(user_input: str, target_sentence: str) -> str:
     if not target_sentence:
         return handle_grammar(user_input)
     return handle_grammar_core(target_sentence)
+
+
+# Async variants: T5 runs in a worker thread and the caller makes the explanation LLM call.
+# grammar_reply_async returns the finished reply, or (system prompt, user prompt, use_cache,
+# preamble, on_answer) for the explanation call. A correction already started speculatively
+# for the same sentence is reused, and on_event receives {"edits": ...} once they are known.
+# With stream_draft (the streaming endpoint only), on_event first receives the pre-check's
+# greedy draft as {"correction_delta": ...}.
+async def grammar_reply_async(original_sentence: str, speculation=None, on_event=None, stream_draft: bool = False):
+    cached = await asyncio.to_thread(correction_cache.get, original_sentence)
+
+    corrected = cached["corrected"] if cached is not None else None
+    if corrected is None and speculation:
+        corrected = await speculation.take_grammar(original_sentence)
+    if corrected is None:
+        if stream_draft and on_event and grammar_streaming_enabled():
+            # Tokens arrive on the generate thread; hand them to the event loop in order
+            loop = asyncio.get_running_loop()
+            on_text = lambda text: loop.call_soon_threadsafe(on_event, {"correction_delta": text})
+            already_correct = await asyncio.to_thread(likely_correct_streaming, original_sentence, on_text)
+        else:
+            already_correct = await asyncio.to_thread(likely_correct, original_sentence)
+        if already_correct:
+            # Cached like a correction, so a repeat skips the greedy pass too
+            corrected = original_sentence
+            await asyncio.to_thread(correction_cache.put_correction, original_sentence, corrected)
+    if corrected is None:
+        corrected = await asyncio.to_thread(correct_grammar, original_sentence)
+
+    edits = extract_edits(original_sentence, corrected)
+    if on_event:
+        on_event({"edits": {"original": original_sentence, "corrected": corrected, "edits": edits}})
+
+    if cached is not None and cached["explanation"]:
+        return cached["explanation"]
+
+    plan = plan_explanation(original_sentence, corrected, edits)
+    if isinstance(plan, str):
+        return plan
+
+    system_prompt, user_prompt, preamble = plan
+    return (
+        system_prompt,
+        user_prompt,
+        True,
+        preamble,
+        lambda answer: remember_explanation(original_sentence, preamble + answer),
+    )
+
+
+# Document mode: batches of similar-length sentences run in a worker thread, and
+# on_sentence(result) is called for each sentence as its batch finishes.
+# Returns (system prompt, user prompt, preamble), or the full reply if nothing needed fixing.
+async def document_prompt_async(text: str, on_sentence=None):
+    sentences, separators = split_sentences(text)
+
+    def report(index: int, result: str):
+        if on_sentence:
+            on_sentence({
+                "index": index,
+                "total": len(sentences),
+                "original": sentences[index],
+                "corrected": result,
+                "edits": extract_edits(sentences[index], result),
+            })
+
+    # Cached sentences are reported straight away; the rest are batched
+    corrected = await asyncio.to_thread(cached_corrections, sentences)
+    missing = [i for i, result in enumerate(corrected) if result is None]
+    for index, result in enumerate(corrected):
+        if result is not None:
+            report(index, result)
+
+    for batch in length_sorted_batches([sentences[i] for i in missing]):
+        indices = [missing[position] for position in batch]
+        results = await asyncio.to_thread(correct_and_cache_batch, [sentences[i] for i in indices])
+        for index, result in zip(indices, results):
+            corrected[index] = result
+            report(index, result)
+
+    preamble = document_preamble(join_sentences(corrected, separators))
+    prompt = build_document_prompt(sentences, corrected)
+    if prompt is None:
+        return preamble + NO_DOCUMENT_ERRORS_REPLY
+    return SYSTEM_PROMPT_GRAMMAR_DOCUMENT, prompt, preamble
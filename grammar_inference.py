@@ -1,26 +1,72 @@
-import torch
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+import os
+import re
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from correction_cache import CorrectionCache
+from inference_pool import run_inference, INFERENCE_WORKERS
 
 # Fine-tuned T5 model for grammar correction
 MODEL_PATH = "models/t5-grammar-small"
 
+# ONNX exports of MODEL_PATH, written by `python grammar_onnx.py export`
+ONNX_MODEL_PATH = "models/t5-grammar-small-onnx"
+ONNX_INT8_MODEL_PATH = "models/t5-grammar-small-onnx-int8"
+
+# Inference backend: "torch" (fp32 PyTorch), "onnx" (ONNX Runtime fp32) or "onnx-int8"
+GRAMMAR_BACKEND = os.environ.get("GRAMMAR_BACKEND", "torch")
+
+BACKEND_PATHS = {
+    "torch": MODEL_PATH,
+    "onnx": ONNX_MODEL_PATH,
+    "onnx-int8": ONNX_INT8_MODEL_PATH,
+}
+
 # Lazy loading to avoid loading on import
 tokenizer = None
 model = None
+_load_lock = threading.Lock()
+
+# Load a backend's tokenizer and model; ONNX models expose the same generate() API.
+# torch and transformers are imported here so that importing this module stays cheap.
+def load_backend(backend: str = GRAMMAR_BACKEND):
+    from transformers import T5Tokenizer
+    from model_loading import load_t5
+
+    if backend not in BACKEND_PATHS:
+        raise ValueError(f"Unknown grammar backend: {backend}")
+
+    path = BACKEND_PATHS[backend]
+    backend_tokenizer = T5Tokenizer.from_pretrained(path)
+
+    if backend == "torch":
+        backend_model = load_t5(path)
+    else:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        backend_model = ORTModelForSeq2SeqLM.from_pretrained(path, use_cache=True)
+
+    return backend_tokenizer, backend_model
 
 # Load model only once when first needed
 def load_model():
     global tokenizer, model
 
-    if tokenizer is None or model is None:
-        tokenizer = T5Tokenizer.from_pretrained(MODEL_PATH)
-        model = T5ForConditionalGeneration.from_pretrained(MODEL_PATH)
-        model.eval()
+    with _load_lock:
+        if tokenizer is None or model is None:
+            tokenizer, model = load_backend(GRAMMAR_BACKEND)
 
     return tokenizer, model
 
-# Correct grammar using T5 model with beam search
-def correct_grammar(sentence: str) -> str:
+GENERATION_KWARGS = {
+    "max_length": 128,
+    "num_beams": 4,
+    "early_stopping": True,
+}
+
+# Correct grammar using T5 model with beam search, one sentence per generate call
+def correct_grammar_unbatched(sentence: str) -> str:
+    import torch
     tokenizer, model = load_model()
 
     # T5 expects task prefix
@@ -34,12 +80,387 @@ def correct_grammar(sentence: str) -> str:
     )
 
     with torch.no_grad():
-        outputs = model.generate(
-            inputs,
-            max_length=128,
-            num_beams=4,
-            early_stopping=True
-        )
+        outputs = model.generate(inputs, **GENERATION_KWARGS)
 
     corrected = tokenizer.decode(outputs[0], skip_special_tokens=True)
     return corrected
+
+# Correct several sentences in one padded generate call with a given tokenizer and model
+def generate_corrections(batch_tokenizer, batch_model, sentences: list) -> list:
+    import torch
+    inputs = batch_tokenizer(
+        ["grammar: " + sentence for sentence in sentences],
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=128
+    )
+
+    with torch.no_grad():
+        outputs = batch_model.generate(
+            input_ids=inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            **GENERATION_KWARGS
+        )
+
+    return batch_tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+def _correct_batch_local(sentences: list) -> list:
+    tokenizer, model = load_model()
+    return generate_corrections(tokenizer, model, sentences)
+
+# Runs in an inference worker process when the pool is enabled
+def correct_grammar_batch(sentences: list) -> list:
+    if not sentences:
+        return []
+
+    return run_inference(_correct_batch_local, sentences)
+
+
+# Concurrent callers share generate calls: a worker thread collects requests for up to
+# GRAMMAR_BATCH_WAIT_MS or GRAMMAR_BATCH_SIZE items, runs them as one batch and scatters results.
+# With inference workers, one collector thread per worker keeps every replica busy.
+GRAMMAR_BATCHING = os.environ.get("GRAMMAR_BATCHING", "1") != "0"
+GRAMMAR_BATCH_SIZE = int(os.environ.get("GRAMMAR_BATCH_SIZE", "8"))
+GRAMMAR_BATCH_WAIT_MS = float(os.environ.get("GRAMMAR_BATCH_WAIT_MS", "5"))
+GRAMMAR_BATCH_WORKERS = int(os.environ.get("GRAMMAR_BATCH_WORKERS", str(max(1, INFERENCE_WORKERS))))
+
+
+class GrammarBatcher:
+    def __init__(self, max_batch_size: int = GRAMMAR_BATCH_SIZE, max_wait_ms: float = GRAMMAR_BATCH_WAIT_MS,
+                 run_batch=None, workers: int = GRAMMAR_BATCH_WORKERS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.run_batch = run_batch
+        self.queue = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "batch_seconds_total": 0.0, "max_batch_size": 0}
+        self._workers = [None] * max(1, workers)
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            for i, worker in enumerate(self._workers):
+                if worker is None or not worker.is_alive():
+                    worker = threading.Thread(target=self._run, name=f"grammar-batcher-{i}", daemon=True)
+                    worker.start()
+                    self._workers[i] = worker
+
+    def submit(self, sentence: str) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self.queue.put((sentence, future))
+        return future
+
+    def correct(self, sentence: str) -> str:
+        return self.submit(sentence).result()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait_seconds
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            sentences = [sentence for sentence, _ in batch]
+
+            start = time.perf_counter()
+            try:
+                results = (self.run_batch or correct_grammar_batch)(sentences)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["batch_seconds_total"] += time.perf_counter() - start
+                self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+
+            for (_, future), corrected in zip(batch, results):
+                future.set_result(corrected)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        batches = stats["batches"]
+        stats["avg_batch_size"] = stats["requests"] / batches if batches else 0.0
+        stats["avg_batch_ms"] = stats["batch_seconds_total"] * 1000 / batches if batches else 0.0
+        stats["queued"] = self.queue.qsize()
+        stats["batch_size_limit"] = self.max_batch_size
+        stats["wait_ms"] = self.max_wait_seconds * 1000
+        stats["workers"] = len(self._workers)
+        return stats
+
+
+batcher = GrammarBatcher()
+
+
+# "Already correct" pre-check: a greedy single-beam pass that reproduces the input with high
+# average token probability is taken as error-free, so beam search and the explanation are skipped
+GRAMMAR_PRECHECK = os.environ.get("GRAMMAR_PRECHECK", "1") != "0"
+PRECHECK_MIN_CONFIDENCE = float(os.environ.get("PRECHECK_MIN_CONFIDENCE", "0.9"))
+
+_precheck_stats = {"checked": 0, "skipped": 0}
+
+
+def _same_sentence(a: str, b: str) -> bool:
+    return " ".join(a.split()) == " ".join(b.split())
+
+
+# Greedy output and its confidence (geometric mean token probability) for each sentence.
+# A transformers streamer (single sentence only) receives the tokens as they are generated.
+def greedy_outputs(check_tokenizer, check_model, sentences: list, streamer=None) -> list:
+    import torch
+    inputs = check_tokenizer(
+        ["grammar: " + sentence for sentence in sentences],
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=128
+    )
+
+    with torch.no_grad():
+        generated = check_model.generate(
+            input_ids=inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            max_length=GENERATION_KWARGS["max_length"],
+            num_beams=1,
+            do_sample=False,
+            output_scores=True,
+            return_dict_in_generate=True,
+            streamer=streamer,
+        )
+        scores = check_model.compute_transition_scores(generated.sequences, generated.scores, normalize_logits=True)
+
+    # Scores line up with the generated tokens after the decoder start token; padding is masked out
+    tokens = generated.sequences[:, 1:]
+    mask = (tokens != check_tokenizer.pad_token_id).float()
+    mean_log_probs = (scores * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+    texts = check_tokenizer.batch_decode(generated.sequences, skip_special_tokens=True)
+    return [(text, float(torch.exp(log_prob))) for text, log_prob in zip(texts, mean_log_probs)]
+
+
+def precheck_decisions(outputs: list, sentences: list, threshold: float = PRECHECK_MIN_CONFIDENCE) -> list:
+    return [
+        _same_sentence(text, sentence) and confidence >= threshold
+        for (text, confidence), sentence in zip(outputs, sentences)
+    ]
+
+
+def _precheck_local(sentences: list) -> list:
+    tokenizer, model = load_model()
+    return precheck_decisions(greedy_outputs(tokenizer, model, sentences), sentences)
+
+# True for each sentence the pre-check considers already correct
+def likely_correct_batch(sentences: list) -> list:
+    if not GRAMMAR_PRECHECK or not sentences:
+        return [False] * len(sentences)
+
+    decisions = run_inference(_precheck_local, sentences)
+
+    _precheck_stats["checked"] += len(sentences)
+    _precheck_stats["skipped"] += sum(decisions)
+    return decisions
+
+
+def likely_correct(sentence: str) -> bool:
+    return likely_correct_batch([sentence])[0]
+
+
+# Streaming mode: the pre-check's greedy pass is decoded token by token, so a draft correction
+# reaches the learner within a few hundred milliseconds while beam search (if still needed) and
+# the explanation follow. Tokens cannot stream back from pool workers, so it needs in-process inference.
+GRAMMAR_STREAMING = os.environ.get("GRAMMAR_STREAMING", "1") != "0"
+STREAM_TOKEN_TIMEOUT = 30
+
+
+def grammar_streaming_enabled() -> bool:
+    return GRAMMAR_STREAMING and INFERENCE_WORKERS == 0
+
+
+# Greedy pass with each decoded piece of text passed to on_text as it is generated;
+# returns (text, confidence) like greedy_outputs
+def stream_greedy_output(sentence: str, on_text):
+    from transformers import TextIteratorStreamer
+
+    tokenizer, model = load_model()
+    streamer = TextIteratorStreamer(tokenizer, skip_special_tokens=True, timeout=STREAM_TOKEN_TIMEOUT)
+    result = {}
+
+    def generate():
+        try:
+            result["output"] = greedy_outputs(tokenizer, model, [sentence], streamer)[0]
+        except Exception as e:
+            result["error"] = e
+            streamer.end()
+
+    worker = threading.Thread(target=generate, name="grammar-stream", daemon=True)
+    worker.start()
+    for text in streamer:
+        if text:
+            on_text(text)
+    worker.join()
+
+    if "error" in result:
+        raise result["error"]
+    return result["output"]
+
+
+# Streaming variant of likely_correct: the greedy draft goes to on_text while it is checked
+def likely_correct_streaming(sentence: str, on_text) -> bool:
+    output = stream_greedy_output(sentence, on_text)
+    if not GRAMMAR_PRECHECK:
+        return False
+
+    decision = precheck_decisions([output], [sentence])[0]
+    _precheck_stats["checked"] += 1
+    _precheck_stats["skipped"] += int(decision)
+    return decision
+
+
+def precheck_stats() -> dict:
+    stats = dict(_precheck_stats)
+    stats["enabled"] = GRAMMAR_PRECHECK
+    stats["min_confidence"] = PRECHECK_MIN_CONFIDENCE
+    stats["skip_rate"] = stats["skipped"] / stats["checked"] if stats["checked"] else 0.0
+    return stats
+
+# Corrections (and their explanations) are reused until the active backend's model files change
+correction_cache = CorrectionCache(BACKEND_PATHS[GRAMMAR_BACKEND])
+
+# Correct grammar using T5 model with beam search (batched with concurrent callers)
+def correct_grammar(sentence: str) -> str:
+    cached = correction_cache.get(sentence)
+    if cached is not None:
+        return cached["corrected"]
+
+    if GRAMMAR_BATCHING:
+        corrected = batcher.correct(sentence)
+    else:
+        corrected = run_inference(correct_grammar_unbatched, sentence)
+
+    correction_cache.put_correction(sentence, corrected)
+    return corrected
+
+
+# Cached corrections for each sentence, None where the model still has to run
+def cached_corrections(sentences: list) -> list:
+    results = []
+    for sentence in sentences:
+        cached = correction_cache.get(sentence)
+        results.append(cached["corrected"] if cached is not None else None)
+    return results
+
+
+# Beam search only for sentences the pre-check does not pass; those are returned unchanged
+# and cached as their own correction
+def correct_and_cache_batch(sentences: list) -> list:
+    corrected = list(sentences)
+    needs_model = []
+    for index, ok in enumerate(likely_correct_batch(sentences)):
+        if ok:
+            correction_cache.put_correction(sentences[index], sentences[index])
+        else:
+            needs_model.append(index)
+
+    results = correct_grammar_batch([sentences[i] for i in needs_model])
+    for index, result in zip(needs_model, results):
+        corrected[index] = result
+        correction_cache.put_correction(sentences[index], result)
+    return corrected
+
+
+# One beam-search and one greedy pass in this process (the API process, or an inference
+# worker's initializer), so lazy initialisation is paid before the first request
+WARMUP_SENTENCE = "She go to school every day."
+
+
+def warm_up_grammar(sentence: str = WARMUP_SENTENCE):
+    _correct_batch_local([sentence])
+    _precheck_local([sentence])
+
+
+def grammar_batch_stats() -> dict:
+    return {"enabled": GRAMMAR_BATCHING, "backend": GRAMMAR_BACKEND, **batcher.get_stats()}
+
+
+def correction_cache_stats() -> dict:
+    return correction_cache.get_stats()
+
+
+# Document mode: longer texts are split into sentences so nothing is truncated at 128 tokens
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "st.", "vs.", "etc.", "e.g.", "i.e.", "no."}
+SENTENCE_END = re.compile(r"[.!?]+[\"'\u201d\u2019)\]]*$")
+
+
+def _ends_sentence(text: str) -> bool:
+    last_word = text.split()[-1]
+    if not SENTENCE_END.search(last_word):
+        return False
+    if last_word.lower() in ABBREVIATIONS:
+        return False
+    # Initials such as "J."
+    return not (len(last_word) == 2 and last_word[0].isupper())
+
+
+# Split text into sentences plus the whitespace after each, so that
+# "".join(s + sep for s, sep in zip(sentences, separators)) rebuilds the text
+def split_sentences(text: str):
+    sentences = []
+    separators = []
+    current = ""
+
+    for token in re.split(r"(\s+)", text.strip()):
+        if not token:
+            continue
+        if token.isspace():
+            if current and ("\n" in token or _ends_sentence(current)):
+                sentences.append(current)
+                separators.append(token)
+                current = ""
+            elif current:
+                current += token
+            continue
+        current += token
+
+    if current:
+        sentences.append(current)
+        separators.append("")
+
+    return sentences, separators
+
+
+def join_sentences(sentences: list, separators: list) -> str:
+    return "".join(sentence + separator for sentence, separator in zip(sentences, separators))
+
+
+# Sentence indices grouped into batches of similar length, shortest first, to minimise padding
+def length_sorted_batches(sentences: list, batch_size: int = GRAMMAR_BATCH_SIZE):
+    order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+# Correct a whole document; returns the corrected sentences in their original order.
+# Cached sentences are reused and only the rest are batched.
+def correct_document(sentences: list, batch_size: int = GRAMMAR_BATCH_SIZE) -> list:
+    corrected = cached_corrections(sentences)
+    missing = [i for i, result in enumerate(corrected) if result is None]
+
+    for batch in length_sorted_batches([sentences[i] for i in missing], batch_size):
+        indices = [missing[position] for position in batch]
+        for index, result in zip(indices, correct_and_cache_batch([sentences[i] for i in indices])):
+            corrected[index] = result
+    return corrected
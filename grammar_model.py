@@ -1,4 +1,8 @@
 import os
+import json
+import shutil
+import hashlib
+import argparse
 from datasets import load_from_disk
 from transformers import T5Tokenizer, T5ForConditionalGeneration, DataCollatorForSeq2Seq, TrainingArguments, Trainer
 
@@ -7,9 +11,16 @@ from transformers import T5Tokenizer, T5ForConditionalGeneration, DataCollatorFo
 MODEL_NAME = "t5-small"
 MAX_INPUT_LENGTH = 128
 MAX_TARGET_LENGTH = 128
+TASK_PREFIX = "grammar: "
 
+DATA_DIR = "data/grammar_correction_pairs"
 
-def load_dataset(data_dir="data/grammar_correction_pairs"):
+# Tokenized splits are saved here once and reused by later runs with the same data,
+# tokenizer and length limits
+TOKENIZED_CACHE_DIR = "data/tokenized_cache"
+
+
+def load_dataset(data_dir=DATA_DIR):
     dataset = load_from_disk(data_dir)
     print(dataset)
     return dataset
@@ -25,7 +36,7 @@ def preprocess_function(examples, tokenizer):
     inputs = []
 
     for sentence in examples["source"]:
-        inputs.append("grammar: " + sentence)
+        inputs.append(TASK_PREFIX + sentence)
 
     targets = examples["target"]
 
@@ -43,20 +54,69 @@ def preprocess_function(examples, tokenizer):
         )
 
     model_inputs["labels"] = labels["input_ids"]
-    return model_inputs
 
-# Load data, tokenize, and fine-tune T5 model
-def main():
-    raw_datasets = load_dataset()
+    # Read by the length-grouped sampler instead of re-measuring every example
+    model_inputs["length"] = [len(ids) for ids in model_inputs["input_ids"]]
+    return model_inputs
 
-    tokenizer, model = get_tokenizer_and_model()
+# Everything that changes the tokenized output: the raw data's fingerprints, the tokenizer and the length limits
+def tokenized_cache_key(tokenizer, data_dir=DATA_DIR):
+    digest = hashlib.sha256()
+
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".json"):
+                with open(os.path.join(root, name), "rb") as f:
+                    digest.update(name.encode("utf-8") + f.read())
+
+    config = {
+        "tokenizer": tokenizer.name_or_path,
+        "tokenizer_class": type(tokenizer).__name__,
+        "vocab_size": len(tokenizer),
+        "max_input_length": MAX_INPUT_LENGTH,
+        "max_target_length": MAX_TARGET_LENGTH,
+        "prefix": TASK_PREFIX,
+    }
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+# Tokenize with num_proc workers on the first run, then load the saved Arrow splits
+def tokenize_datasets(raw_datasets, tokenizer, data_dir=DATA_DIR, num_proc=None,
+                      cache_dir=TOKENIZED_CACHE_DIR, rebuild=False):
+    cache_path = os.path.join(cache_dir, tokenized_cache_key(tokenizer, data_dir))
+
+    if os.path.exists(cache_path) and not rebuild:
+        print(f"Loading tokenized data from {cache_path}")
+        return load_from_disk(cache_path)
 
     tokenized_datasets = raw_datasets.map(
-        lambda batch: preprocess_function(batch, tokenizer),
+        preprocess_function,
+        fn_kwargs={"tokenizer": tokenizer},
         batched=True,
+        num_proc=num_proc,
         remove_columns=["source", "target"],
+        desc="Tokenizing",
     )
 
+    # Written under a temporary name so an interrupted run never leaves a partial cache
+    partial_path = cache_path + ".partial"
+    shutil.rmtree(partial_path, ignore_errors=True)
+    tokenized_datasets.save_to_disk(partial_path)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(partial_path, cache_path)
+    print(f"Saved tokenized data to {cache_path}")
+
+    return tokenized_datasets
+
+# Load data, tokenize (or reuse the cache), and fine-tune T5 model
+def main(num_proc=None, rebuild_cache=False):
+    raw_datasets = load_dataset()
+
+    tokenizer, model = get_tokenizer_and_model()
+
+    tokenized_datasets = tokenize_datasets(raw_datasets, tokenizer, num_proc=num_proc, rebuild=rebuild_cache)
+
     train_dataset = tokenized_datasets["train"]
     eval_dataset = tokenized_datasets["test"]
 
@@ -81,6 +141,9 @@ def main():
         learning_rate=3e-4,
         weight_decay=0.01,
         warmup_steps=1000,
+        # Batches of similar length, so little of each batch is padding
+        group_by_length=True,
+        length_column_name="length",
         report_to="none",
         fp16=False,
     )
@@ -101,4 +164,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fine-tune T5 for grammar correction")
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count(), help="tokenization processes")
+    parser.add_argument("--rebuild-cache", action="store_true", help="re-tokenize even if a cached copy exists")
+    args = parser.parse_args()
+
+    main(args.num_proc, args.rebuild_cache)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import statistics
+from datasets import load_from_disk
+from sacrebleu.metrics import CHRF
+
+from grammar_inference import (
+    MODEL_PATH,
+    ONNX_MODEL_PATH,
+    ONNX_INT8_MODEL_PATH,
+    BACKEND_PATHS,
+    generate_corrections,
+    load_backend,
+)
+
+# Export the fine-tuned T5 grammar model to ONNX (encoder, decoder and decoder-with-past)
+# plus a dynamically int8-quantized copy, and compare the backends on the held-out pairs
+
+TEST_DATA_DIR = "data/grammar_correction_pairs"
+REPORT_PATH = "models/grammar_backends_report.json"
+
+# Instruction sets supported by optimum's AutoQuantizationConfig
+QUANTIZATION_TARGETS = ["avx2", "avx512", "avx512_vnni", "arm64"]
+
+
+def export_onnx(model_path: str = MODEL_PATH, output_dir: str = ONNX_MODEL_PATH):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import T5Tokenizer
+
+    onnx_model = ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True, use_cache=True)
+    onnx_model.save_pretrained(output_dir)
+    T5Tokenizer.from_pretrained(model_path).save_pretrained(output_dir)
+    return output_dir
+
+
+# Dynamic int8 quantization (no calibration data) of every ONNX graph in onnx_dir.
+# Quantized files keep their original names so the directory loads like the fp32 export.
+def quantize_onnx(onnx_dir: str = ONNX_MODEL_PATH, output_dir: str = ONNX_INT8_MODEL_PATH, target: str = "avx2"):
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if target == "arm64":
+        config = AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    else:
+        config = getattr(AutoQuantizationConfig, target)(is_static=False, per_channel=False)
+
+    os.makedirs(output_dir, exist_ok=True)
+    onnx_files = [name for name in os.listdir(onnx_dir) if name.endswith(".onnx")]
+
+    for file_name in onnx_files:
+        quantizer = ORTQuantizer.from_pretrained(onnx_dir, file_name=file_name)
+        quantizer.quantize(save_dir=output_dir, quantization_config=config)
+
+        stem = file_name[:-len(".onnx")]
+        quantized = os.path.join(output_dir, f"{stem}_quantized.onnx")
+        os.replace(quantized, os.path.join(output_dir, file_name))
+
+    # Config, generation config and tokenizer files are shared with the fp32 export
+    for name in os.listdir(onnx_dir):
+        if not name.endswith(".onnx") and os.path.isfile(os.path.join(onnx_dir, name)):
+            shutil.copy(os.path.join(onnx_dir, name), os.path.join(output_dir, name))
+
+    return output_dir
+
+
+def load_pairs(count: int, data_dir: str = TEST_DATA_DIR):
+    test = load_from_disk(data_dir)["test"]
+    count = min(count, len(test))
+    return test["source"][:count], test["target"][:count]
+
+
+def run_backend(backend: str, sources, batch_size: int):
+    backend_tokenizer, backend_model = load_backend(backend)
+
+    # Warm up so session creation is not counted
+    generate_corrections(backend_tokenizer, backend_model, sources[:1])
+
+    outputs = []
+    latencies = []
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        began = time.perf_counter()
+        outputs.extend(generate_corrections(backend_tokenizer, backend_model, batch))
+        latencies.append((time.perf_counter() - began) / len(batch))
+
+    return outputs, latencies
+
+
+# chrF of each backend against the references and against the fp32 torch outputs, plus latency
+def compare_backends(backends, count: int = 500, batch_size: int = 1, data_dir: str = TEST_DATA_DIR):
+    sources, references = load_pairs(count, data_dir)
+    chrf = CHRF()
+
+    outputs = {}
+    report = {"examples": len(sources), "batch_size": batch_size, "backends": {}}
+
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        outputs[backend], latencies = run_backend(backend, sources, batch_size)
+        ordered = sorted(latencies)
+        report["backends"][backend] = {
+            "chrf_vs_reference": chrf.corpus_score(outputs[backend], [references]).score,
+            "chrf_vs_torch": chrf.corpus_score(outputs[backend], [outputs["torch"]]).score,
+            "exact_match_vs_torch": sum(
+                1 for a, b in zip(outputs[backend], outputs["torch"]) if a == b
+            ) / len(sources),
+            "mean_ms_per_sentence": statistics.mean(latencies) * 1000,
+            "p95_ms_per_sentence": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+        }
+
+    torch_ms = report["backends"]["torch"]["mean_ms_per_sentence"]
+    for result in report["backends"].values():
+        result["speedup_vs_torch"] = torch_ms / result["mean_ms_per_sentence"]
+
+    return report
+
+
+def print_report(report: dict):
+    print(f"{report['examples']} held-out pairs, batch size {report['batch_size']}")
+    for backend, result in report["backends"].items():
+        print(
+            f"{backend:<10} chrF(ref) {result['chrf_vs_reference']:6.2f}   "
+            f"chrF(torch) {result['chrf_vs_torch']:6.2f}   "
+            f"exact {result['exact_match_vs_torch']:6.1%}   "
+            f"{result['mean_ms_per_sentence']:7.1f} ms/sent   "
+            f"p95 {result['p95_ms_per_sentence']:7.1f} ms   {result['speedup_vs_torch']:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the grammar model to ONNX and compare inference backends")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="export fp32 ONNX and an int8-quantized copy")
+    export_parser.add_argument("--model", default=MODEL_PATH)
+    export_parser.add_argument("--output", default=ONNX_MODEL_PATH)
+    export_parser.add_argument("--int8-output", default=ONNX_INT8_MODEL_PATH)
+    export_parser.add_argument("--target", choices=QUANTIZATION_TARGETS, default="avx2")
+
+    compare_parser = commands.add_parser("compare", help="chrF parity and latency against the fp32 torch model")
+    compare_parser.add_argument("--backends", nargs="+", choices=list(BACKEND_PATHS), default=["onnx", "onnx-int8"])
+    compare_parser.add_argument("--count", type=int, default=500)
+    compare_parser.add_argument("--batch-size", type=int, default=1)
+    compare_parser.add_argument("--data-dir", default=TEST_DATA_DIR)
+    compare_parser.add_argument("--report", default=REPORT_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model, args.output)
+        print(f"Exported ONNX model to {args.output}")
+        quantize_onnx(args.output, args.int8_output, args.target)
+        print(f"Saved int8 model to {args.int8_output}")
+    else:
+        report = compare_backends(args.backends, args.count, args.batch_size, args.data_dir)
+        print_report(report)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.report}")
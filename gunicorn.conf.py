@@ -0,0 +1,28 @@
+import os
+
+# Pre-fork serving: the models are loaded once in the gunicorn master (see on_starting), then
+# the UvicornWorker processes are forked and share the weights copy-on-write. The app itself is
+# imported in each worker, so the session store and LLM cache open their own SQLite
+# connections after the fork.
+#   gunicorn main:app -c gunicorn.conf.py
+bind = os.environ.get("BIND", "127.0.0.1:8000")
+# Quiz state (main.quiz_sessions, the learning-profile cache) is still per process, so the
+# quiz endpoints only work reliably with one worker
+workers = int(os.environ.get("WEB_WORKERS", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Each worker is its own process: sessions must live in the shared SQLite store and must not be
+# held in a per-process write-back cache. Set here so every worker inherits them; with other
+# settings chat_manager refuses to start a second worker.
+os.environ.setdefault("SESSION_BACKEND", "sqlite")
+os.environ.setdefault("SESSION_CACHE_SIZE", "0")
+
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "1") != "0"
+
+
+# Runs in the master before any worker is forked
+def on_starting(server):
+    if PRELOAD_MODELS:
+        from inference_pool import preload_models
+        preload_models()
+        server.log.info("Loaded grammar and quiz models before forking workers")
@@ -0,0 +1,240 @@
+import os
+import time
+import threading
+import multiprocessing
+from multiprocessing import forkserver
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Model inference in worker processes instead of the API process, so T5 generate calls run
+# in parallel outside the GIL and the event loop stays responsive. Workers are forked from a
+# single-threaded fork server rather than from the API process, so (re)starting the pool is
+# safe while the server is running. Each worker loads the models itself; memory-mapped
+# safetensors weights (see model_loading) are shared between workers through the page cache.
+# INFERENCE_WORKERS=0 keeps inference in-process.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+
+# Torch intra-op threads per worker; by default the cores are split evenly between workers
+INFERENCE_THREADS_PER_WORKER = int(
+    os.environ.get("INFERENCE_THREADS_PER_WORKER", str(max(1, (os.cpu_count() or 1) // max(1, INFERENCE_WORKERS))))
+)
+
+# Back-pressure: at most this many calls per worker are queued or running; further callers
+# wait up to INFERENCE_QUEUE_TIMEOUT seconds for a slot, then get InferencePoolBusy
+INFERENCE_QUEUE_DEPTH = int(os.environ.get("INFERENCE_QUEUE_DEPTH", "4"))
+INFERENCE_QUEUE_TIMEOUT = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", "10"))
+
+# How long start-up (or a rebuild) may take for every worker to load and warm up its models
+INFERENCE_WARMUP_TIMEOUT = float(os.environ.get("INFERENCE_WARMUP_TIMEOUT", "600"))
+
+# Set in worker processes, where inference always runs locally
+_in_worker = False
+
+
+class InferencePoolBusy(Exception):
+    pass
+
+
+def _init_worker(threads: int):
+    global _in_worker
+    _in_worker = True
+
+    import torch
+    torch.set_num_threads(threads)
+
+    # Load and warm up the models before the worker takes any call
+    from grammar_inference import warm_up_grammar
+    from quiz import warm_up_quiz_model
+    warm_up_grammar()
+    warm_up_quiz_model()
+
+
+def _ping():
+    return os.getpid()
+
+
+# Load the models for in-process inference before the server forks its own workers.
+# With an inference pool the API process never runs a model, so there is nothing to load.
+def preload_models():
+    if INFERENCE_WORKERS > 0:
+        return
+
+    from grammar_inference import load_model, GRAMMAR_BACKEND
+    from quiz import load_quiz_model
+
+    # ONNX Runtime sessions are not fork-safe, so ONNX backends load lazily in each process
+    if GRAMMAR_BACKEND == "torch":
+        load_model()
+    load_quiz_model()
+
+
+# The fork server is launched with fork+exec, so it never inherits the API process's threads
+def _fork_server_context():
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["inference_pool"])
+    return context
+
+
+class InferencePool:
+    def __init__(self, workers: int = INFERENCE_WORKERS, threads_per_worker: int = INFERENCE_THREADS_PER_WORKER,
+                 queue_depth: int = INFERENCE_QUEUE_DEPTH, queue_timeout: float = INFERENCE_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_pending = workers * queue_depth
+        self.queue_timeout = queue_timeout
+        self.stats = {"calls": 0, "rejected": 0, "failed": 0, "restarts": 0, "seconds_total": 0.0}
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._broken = False
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=_fork_server_context(),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker,),
+        )
+
+    # Create the pool and launch the fork server; workers start as calls (or warm_up) arrive
+    def start(self):
+        with self._lock:
+            if self._executor is not None or self._broken:
+                return
+            self._executor = self._create_executor()
+        forkserver.ensure_running()
+
+    # A worker answers a ping only after its initializer has loaded and warmed up the models,
+    # so seeing every worker's pid means every replica is warm. Pings are sent in rounds of one
+    # per worker; while no worker is idle, each submission starts another worker.
+    def _wait_for_workers(self, executor, timeout: float = INFERENCE_WARMUP_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        ready = set()
+
+        while len(ready) < self.workers:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Only {len(ready)} of {self.workers} inference workers started")
+            futures = [executor.submit(_ping) for _ in range(self.workers)]
+            ready.update(future.result() for future in futures)
+            if len(ready) < self.workers:
+                time.sleep(0.2)
+
+    # Start every worker and return once all of them are warm
+    def warm_up(self):
+        self.start()
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            self._wait_for_workers(executor)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.stats["rejected"] += 1
+            raise InferencePoolBusy(f"All {self.workers} inference workers are busy")
+
+        with self._lock:
+            if self._executor is None and not self._broken:
+                self._executor = self._create_executor()
+            executor = None if self._broken else self._executor
+            if executor is not None:
+                self._pending += 1
+
+        if executor is None:
+            self._slots.release()
+            self.stats["rejected"] += 1
+            raise InferencePoolBusy("Inference workers are restarting")
+
+        start = time.perf_counter()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory): this call fails with a 503 and the pool is rebuilt
+            self.stats["failed"] += 1
+            self._mark_broken(executor)
+            raise InferencePoolBusy("Inference workers are restarting") from e
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self.stats["calls"] += 1
+            self.stats["seconds_total"] += time.perf_counter() - start
+            self._slots.release()
+
+    # Calls fail fast with InferencePoolBusy until a background thread has a fresh pool running
+    def _mark_broken(self, broken):
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+            self._broken = True
+            self.stats["restarts"] += 1
+
+        broken.shutdown(wait=False, cancel_futures=True)
+        threading.Thread(target=self._rebuild, name="inference-pool-rebuild", daemon=True).start()
+
+    def _rebuild(self):
+        executor = self._create_executor()
+        try:
+            self._wait_for_workers(executor)
+        except Exception as e:
+            # The next call tries again with a fresh pool
+            print(f"Inference pool rebuild failed: {e}")
+            executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._broken = False
+            return
+
+        with self._lock:
+            self._executor = executor
+            self._broken = False
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["workers"] = self.workers
+        stats["threads_per_worker"] = self.threads_per_worker
+        stats["running"] = self._executor is not None
+        stats["broken"] = self._broken
+        stats["in_flight"] = self._pending
+        stats["max_pending"] = self.max_pending
+        stats["avg_ms"] = stats["seconds_total"] * 1000 / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+
+pool = InferencePool() if INFERENCE_WORKERS > 0 else None
+
+
+# Run a module-level inference function in a worker process, or in-process without a pool
+def run_inference(fn, *args):
+    if pool is None or _in_worker:
+        return fn(*args)
+    return pool.run(fn, *args)
+
+
+# Launches the fork server; call before the API process starts any other thread
+def start_inference_pool():
+    if pool is not None:
+        pool.start()
+
+
+# Blocks until every worker has loaded and warmed up its models
+def warm_up_inference_pool():
+    if pool is not None:
+        pool.warm_up()
+
+
+def close_inference_pool():
+    if pool is not None:
+        pool.shutdown()
+
+
+def inference_pool_stats() -> dict:
+    if pool is None:
+        return {"enabled": False}
+    return {"enabled": True, **pool.get_stats()}
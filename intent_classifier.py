@@ -0,0 +1,238 @@
+import os
+import json
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+
+from grammar_handler import extract_grammar_target
+from vocab_handler import extract_vocab_target
+
+# Local intent model: TF-IDF features + logistic regression, trained on
+# (message, analyze_with_llm result) pairs logged by llm_intent
+INTENT_LOG_PATH = "data/intent_log.jsonl"
+INTENT_MODEL_PATH = "models/intent_classifier.joblib"
+INTENT_REPORT_PATH = "models/intent_classifier_report.json"
+
+INTENTS = ["vocab_lookup", "grammar_correction", "general_chat"]
+
+# Predictions below this probability go to the LLM instead
+INTENT_CONFIDENCE_THRESHOLD = float(os.environ.get("INTENT_CONFIDENCE_THRESHOLD", "0.85"))
+
+# Set INTENT_LOG_ENABLED=0 to stop collecting training pairs
+INTENT_LOG_ENABLED = os.environ.get("INTENT_LOG_ENABLED", "1") != "0"
+
+MIN_TRAINING_EXAMPLES = 50
+TEST_SIZE = 0.2
+
+_log_lock = threading.Lock()
+
+
+def _normalize(message: str) -> str:
+    return " ".join(message.strip().lower().split())
+
+
+# Append one labelled example; failures are logged and never reach the caller
+def log_intent_example(message: str, result: dict, path: str = INTENT_LOG_PATH):
+    if not INTENT_LOG_ENABLED or not message.strip():
+        return
+
+    record = {
+        "message": message,
+        "intent": result.get("intent"),
+        "vocab_target": result.get("vocab_target"),
+        "grammar_target": result.get("grammar_target"),
+        "logged_at": datetime.now().isoformat(),
+    }
+
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Intent log write failed: {e}")
+
+
+# Read logged pairs; the latest label wins for repeated messages
+def load_examples(path: str = INTENT_LOG_PATH):
+    latest = {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            message = record.get("message") or ""
+            intent = record.get("intent")
+            if message.strip() and intent in INTENTS:
+                latest[_normalize(message)] = (message, intent)
+
+    messages = [message for message, _ in latest.values()]
+    labels = [intent for _, intent in latest.values()]
+    return messages, labels
+
+
+# Word n-grams catch phrasing ("what does", "fix my"); char n-grams cope with typos
+def build_pipeline():
+    from sklearn.pipeline import Pipeline, FeatureUnion
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    features = FeatureUnion([
+        ("words", TfidfVectorizer(lowercase=True, ngram_range=(1, 2), min_df=1, sublinear_tf=True)),
+        ("chars", TfidfVectorizer(lowercase=True, analyzer="char_wb", ngram_range=(2, 4), min_df=2, sublinear_tf=True)),
+    ])
+
+    return Pipeline([
+        ("features", features),
+        ("classifier", LogisticRegression(max_iter=1000, class_weight="balanced")),
+    ])
+
+
+# Accuracy overall and on the confident subset that would skip the LLM
+def evaluate(pipeline, messages, labels, threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+    from sklearn.metrics import classification_report, confusion_matrix
+
+    probabilities = pipeline.predict_proba(messages)
+    classes = list(pipeline.classes_)
+    predicted = [classes[row.argmax()] for row in probabilities]
+    confidences = [float(row.max()) for row in probabilities]
+
+    confident = [i for i, confidence in enumerate(confidences) if confidence >= threshold]
+    confident_correct = sum(1 for i in confident if predicted[i] == labels[i])
+
+    return {
+        "examples": len(labels),
+        "accuracy": sum(1 for p, l in zip(predicted, labels) if p == l) / len(labels),
+        "threshold": threshold,
+        "coverage": len(confident) / len(labels),
+        "confident_accuracy": confident_correct / len(confident) if confident else None,
+        "per_class": classification_report(labels, predicted, labels=classes, output_dict=True, zero_division=0),
+        "confusion_matrix": {
+            "labels": classes,
+            "matrix": confusion_matrix(labels, predicted, labels=classes).tolist(),
+        },
+    }
+
+
+# Fit on the logged pairs, save the model and a JSON evaluation report
+def train(log_path: str = INTENT_LOG_PATH, model_path: str = INTENT_MODEL_PATH,
+          report_path: str = INTENT_REPORT_PATH, threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+    import joblib
+    from sklearn.model_selection import train_test_split
+
+    messages, labels = load_examples(log_path)
+    if len(messages) < MIN_TRAINING_EXAMPLES:
+        raise ValueError(f"Need at least {MIN_TRAINING_EXAMPLES} logged messages, found {len(messages)}")
+
+    counts = Counter(labels)
+    stratify = labels if min(counts.values()) >= 2 and len(counts) > 1 else None
+    train_messages, test_messages, train_labels, test_labels = train_test_split(
+        messages, labels, test_size=TEST_SIZE, random_state=42, stratify=stratify
+    )
+
+    pipeline = build_pipeline()
+    pipeline.fit(train_messages, train_labels)
+    report = evaluate(pipeline, test_messages, test_labels, threshold)
+
+    # Ship a model trained on everything; the report reflects the held-out split
+    pipeline.fit(messages, labels)
+
+    report["trained_at"] = datetime.now().isoformat()
+    report["train_examples"] = len(messages)
+    report["label_counts"] = dict(counts)
+
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    joblib.dump(pipeline, model_path)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    return report
+
+
+# Loads the saved model on first use; without one, predict() always defers to the LLM
+class IntentClassifier:
+    def __init__(self, model_path: str = INTENT_MODEL_PATH, threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+        self.model_path = model_path
+        self.threshold = threshold
+        self.pipeline = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    # scikit-learn is only imported once a trained model exists
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return self.pipeline
+            if os.path.exists(self.model_path):
+                try:
+                    import joblib
+                    self.pipeline = joblib.load(self.model_path)
+                except Exception as e:
+                    print(f"Intent model load failed: {e}")
+            self._loaded = True
+            return self.pipeline
+
+    # (intent, confidence), or (None, 0.0) if no model is available
+    def predict(self, message: str):
+        pipeline = self.load()
+        if pipeline is None:
+            return None, 0.0
+
+        probabilities = pipeline.predict_proba([message])[0]
+        best = probabilities.argmax()
+        return pipeline.classes_[best], float(probabilities[best])
+
+    # Same shape as llm_intent.parse_intent_response, or None when unsure
+    def classify(self, message: str):
+        intent, confidence = self.predict(message)
+        if intent is None or confidence < self.threshold:
+            return None
+
+        if intent == "vocab_lookup":
+            target = extract_vocab_target(message)
+            if not target:
+                return None
+            return {"intent": intent, "vocab_target": target, "grammar_target": None}
+
+        if intent == "grammar_correction":
+            return {"intent": intent, "vocab_target": None, "grammar_target": extract_grammar_target(message)}
+
+        return {"intent": "general_chat", "vocab_target": None, "grammar_target": None}
+
+
+def print_report(report: dict):
+    print(f"Held-out examples: {report['examples']} (trained on {report['train_examples']})")
+    print(f"Accuracy: {report['accuracy']:.3f}")
+
+    confident_accuracy = report["confident_accuracy"]
+    print(
+        f"At confidence >= {report['threshold']}: coverage {report['coverage']:.1%}, "
+        f"accuracy {confident_accuracy:.3f}" if confident_accuracy is not None
+        else f"At confidence >= {report['threshold']}: no confident predictions"
+    )
+
+    for intent in INTENTS:
+        scores = report["per_class"].get(intent)
+        if scores:
+            print(f"  {intent:<20} precision {scores['precision']:.3f}  recall {scores['recall']:.3f}  "
+                  f"support {int(scores['support'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local intent classifier from logged LLM intents")
+    parser.add_argument("--log", default=INTENT_LOG_PATH)
+    parser.add_argument("--model", default=INTENT_MODEL_PATH)
+    parser.add_argument("--report", default=INTENT_REPORT_PATH)
+    parser.add_argument("--threshold", type=float, default=INTENT_CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    report = train(args.log, args.model, args.report, args.threshold)
+    print_report(report)
+    print(f"Saved model to {args.model} and report to {args.report}")
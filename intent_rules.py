@@ -0,0 +1,98 @@
+import re
+from grammar_handler import GRAMMAR_PATTERNS
+from vocab_handler import VOCAB_PATTERNS
+
+# Local intent rules: resolve obvious messages without the LLM intent call.
+# Each rule only fires on a clear, anchored match; anything else returns None
+# and falls back to the LLM.
+
+# Politeness prefixes allowed in front of a grammar command
+COMMAND_PREFIX = r"\s*(?:(?:can|could|would) you\s+)?(?:please\s+)?"
+
+# Vocab questions must be the whole message, so "what does X mean" in a longer text is left to the LLM
+VOCAB_TRAILING = r"[\s?.!]*"
+MAX_VOCAB_TARGET_WORDS = 4
+MIN_GRAMMAR_TARGET_WORDS = 2
+
+# A command not followed by ":" must be followed by the sentence itself; text starting with one
+# of these ("fix the grammar in this email: ...", "check the grammar of this") is left to the LLM
+FRAMING_WORDS = {
+    "in", "of", "on", "for", "with", "from", "to", "about", "below", "above",
+    "this", "that", "these", "those", "it", "following",
+}
+
+# Short messages that are always small talk
+SMALL_TALK = {
+    "hi", "hello", "hey", "hi there", "hello there",
+    "good morning", "good afternoon", "good evening",
+    "thanks", "thank you", "thanks a lot", "thank you so much",
+    "ok", "okay", "cool", "great", "nice",
+    "bye", "goodbye", "see you",
+}
+
+_grammar_commands = [re.compile(COMMAND_PREFIX + pattern, re.IGNORECASE) for pattern in GRAMMAR_PATTERNS]
+_vocab_questions = [re.compile(pattern + VOCAB_TRAILING) for pattern in VOCAB_PATTERNS]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower()).strip(" .!?,")
+
+
+def _clean_vocab_target(target: str) -> str:
+    target = target.strip(" \"'")
+    return re.sub(r"^(?:the\s+)?(?:word|phrase|term|idiom)\s+", "", target).strip(" \"'")
+
+
+# Target of a grammar command, only when the sentence follows the command directly
+def match_grammar(text: str):
+    for command in _grammar_commands:
+        match = command.match(text)
+        if not match:
+            continue
+
+        target = match.group(1).strip()
+        separator_start = match.start(1)
+        while separator_start > 0 and text[separator_start - 1] in ": ":
+            separator_start -= 1
+        after_colon = ":" in text[separator_start:match.start(1)]
+
+        if not after_colon:
+            first_word = target.split()[0].lower() if target.split() else ""
+            if ":" in target or first_word in FRAMING_WORDS:
+                return None
+        if len(target.split()) >= MIN_GRAMMAR_TARGET_WORDS:
+            return target
+        return None
+    return None
+
+
+def match_vocab(text: str):
+    lower = text.strip().lower()
+    for question in _vocab_questions:
+        match = question.fullmatch(lower)
+        if match:
+            target = _clean_vocab_target(match.group(1))
+            if target and len(target.split()) <= MAX_VOCAB_TARGET_WORDS:
+                return target
+            return None
+    return None
+
+
+# Return the same shape as llm_intent.parse_intent_response, or None when unsure
+def classify_intent(user_input: str):
+    text = user_input.strip()
+    if not text:
+        return None
+
+    grammar_target = match_grammar(text)
+    if grammar_target:
+        return {"intent": "grammar_correction", "vocab_target": None, "grammar_target": grammar_target}
+
+    vocab_target = match_vocab(text)
+    if vocab_target:
+        return {"intent": "vocab_lookup", "vocab_target": vocab_target, "grammar_target": None}
+
+    if _normalize(text) in SMALL_TALK:
+        return {"intent": "general_chat", "vocab_target": None, "grammar_target": None}
+
+    return None
@@ -1,10 +1,11 @@
 import json
 import os
+import asyncio
 from datetime import datetime, timedelta
-from client import call_llm
+from client import call_llm, call_llm_async, BACKGROUND
+from chat_manager import load_session, latest_session_id
 
 USER_DATA_FILE = "data/user_data.json"
-SESSIONS_DIR = "data/sessions"
 os.makedirs("data", exist_ok=True)
 
 _profile_cache = {
@@ -67,30 +68,10 @@ def extract_json_object(text: str) -> str:
 def load_user_conversations():
     user_messages = []
     
-    if not os.path.exists(SESSIONS_DIR):
-        return []
-    
-    session_files = []
-    for fname in os.listdir(SESSIONS_DIR):
-        if not fname.endswith(".json"):
-            continue
-        if fname == "quiz_session.json":
-            continue
-        
-        path = os.path.join(SESSIONS_DIR, fname)
-        try:
-            mtime = os.path.getmtime(path)
-            session_files.append((mtime, fname, path))
-        except:
-            continue
-    
-    session_files.sort(reverse=True)
-    if session_files:
-        _, fname, path = session_files[0]
-        
+    session_id = latest_session_id()
+    if session_id:
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                session_data = json.load(f)
+            session_data = load_session(session_id) or {}
             messages = session_data.get("messages", [])
             
             for msg in messages:
@@ -101,21 +82,15 @@ def load_user_conversations():
     
     return user_messages
 
-def summarize_conversations() -> dict:
-    user_messages = load_user_conversations()
-    
-    default = {
-        "vocab_weakness": [],
-        "grammar_patterns": [],
-        "common_mistakes": [],
-        "overall_skill": "N/A",
-    }
-    
-    if not user_messages:
-        return default
+SUMMARY_DEFAULT = {
+    "vocab_weakness": [],
+    "grammar_patterns": [],
+    "common_mistakes": [],
+    "overall_skill": "N/A",
+}
 
-    messages_text = "\n".join(user_messages)
-    raw = call_llm(SYSTEM_PROMPT_SUMMARIZER, f"Messages:\n{messages_text}")
+def parse_summary(raw: str) -> dict:
+    default = dict(SUMMARY_DEFAULT)
 
     try:
         obj = extract_json_object(raw)
@@ -129,6 +104,29 @@ def summarize_conversations() -> dict:
 
     return data
 
+def summarize_conversations() -> dict:
+    user_messages = load_user_conversations()
+    
+    if not user_messages:
+        return dict(SUMMARY_DEFAULT)
+
+    messages_text = "\n".join(user_messages)
+    raw = call_llm(SYSTEM_PROMPT_SUMMARIZER, f"Messages:\n{messages_text}", use_cache=False)
+    return parse_summary(raw)
+
+async def summarize_conversations_async() -> dict:
+    # latest_session_id flushes pending session writes, so it runs off the event loop
+    user_messages = await asyncio.to_thread(load_user_conversations)
+    
+    if not user_messages:
+        return dict(SUMMARY_DEFAULT)
+
+    messages_text = "\n".join(user_messages)
+    raw = await call_llm_async(
+        SYSTEM_PROMPT_SUMMARIZER, f"Messages:\n{messages_text}", use_cache=False, priority=BACKGROUND
+    )
+    return parse_summary(raw)
+
 def calculate_stats(quiz_history: list) -> dict:
     if not quiz_history:
         return {
@@ -174,14 +172,16 @@ def difficulty_from_accuracy(acc: float) -> str:
     if acc >= 0.5: return "C"
     return "D"
 
-def build_learning_profile() -> dict:
+def cached_profile():
     if _profile_cache["timestamp"] is not None:
         elapsed = datetime.now() - _profile_cache["timestamp"]
         if elapsed < timedelta(minutes=CACHE_EXPIRE_MINUTES):
             return _profile_cache["data"]
+    return None
 
+# Combine conversation summary with quiz stats, persist it, and refresh the cache
+def assemble_profile(convo: dict) -> dict:
     user_data = load_user_data()
-    convo = summarize_conversations()
     stats = calculate_stats(user_data["quiz_history"])
     
     difficulty = difficulty_from_accuracy(stats["average_accuracy"])
@@ -210,6 +210,20 @@ def build_learning_profile() -> dict:
 
     return profile
 
+def build_learning_profile() -> dict:
+    profile = cached_profile()
+    if profile is not None:
+        return profile
+
+    return assemble_profile(summarize_conversations())
+
+async def build_learning_profile_async() -> dict:
+    profile = cached_profile()
+    if profile is not None:
+        return profile
+
+    return assemble_profile(await summarize_conversations_async())
+
 def record_quiz_session(session_questions: list):
     user_data = load_user_data()
     entry = {
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Disk-backed cache of LLM completions, keyed on model + system prompt + user message
+LLM_CACHE_PATH = "data/llm_cache.db"
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+LLM_CACHE_MAX_ENTRIES = 20000
+
+# A hit only rewrites last_used once it is this stale, so most hits are a single read
+LAST_USED_RESOLUTION_SECONDS = 60 * 60
+
+# Past max_entries, the least recently used entries are evicted down to this fraction of it
+EVICT_TO_FRACTION = 0.9
+
+
+def cache_key(model: str, system_prompt: str, user_message: str) -> str:
+    payload = json.dumps([model, system_prompt, user_message], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+
+        self._lock = threading.Lock()
+        self._conn = None
+        # Upper bound on the row count (replacements also count), recounted only past max_entries
+        self._entries = 0
+
+    # The database is opened by the first call in the process that uses the cache, never at
+    # import, so no connection is inherited across fork (e.g. by gunicorn workers)
+    def _ready(self):
+        if self._conn is not None:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions (last_used)")
+        conn.commit()
+        self._entries = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        self._conn = conn
+
+    def get(self, key: str):
+        now = time.time()
+
+        with self._lock:
+            self._ready()
+            row = self._conn.execute(
+                "SELECT response, created_at, last_used FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            response, created_at, last_used = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                self._entries -= 1
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            if now - last_used > LAST_USED_RESOLUTION_SECONDS:
+                self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.stats["hits"] += 1
+            return response
+
+    # Store a completion; past max_entries, evict the least recently used entries in one batch
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+
+        with self._lock:
+            self._ready()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self.stats["stores"] += 1
+            self._entries += 1
+
+            if self._entries > self.max_entries:
+                count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+                overflow = count - int(self.max_entries * EVICT_TO_FRACTION) if count > self.max_entries else 0
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM completions WHERE key IN "
+                        "(SELECT key FROM completions ORDER BY last_used LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.stats["evictions"] += overflow
+                self._entries = count - overflow
+
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._ready()
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+            self._entries = 0
+
+    def get_stats(self):
+        with self._lock:
+            self._ready()
+            stats = dict(self.stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
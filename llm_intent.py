@@ -1,5 +1,11 @@
+import os
 import json
-from client import call_llm_fast
+import random
+import asyncio
+from collections import deque
+from client import call_llm_fast, call_llm_fast_async, BACKGROUND
+from intent_rules import classify_intent
+from intent_classifier import IntentClassifier, log_intent_example
 
 # System prompt that classifies user intent and extracts targets
 SYSTEM_PROMPT_INTENT = """"
@@ -36,45 +42,157 @@ def extract_json_block(text: str) -> str:
     
     return "{}"
 
+DEFAULT_INTENT = {
+    "intent": "general_chat",
+    "vocab_target": None,
+    "grammar_target": None,
+}
+
+# Validate the LLM's JSON and normalize it into intent + targets
+def parse_intent_response(raw_response: str) -> dict:
+    json_text = extract_json_block(raw_response)
+    data = json.loads(json_text)
+    
+    # Validate intent value
+    valid_intents = ["vocab_lookup", "grammar_correction", "general_chat"]
+    intent = data.get("intent", "general_chat")
+    if intent not in valid_intents:
+        intent = "general_chat"
+    
+    # Ensure targets are strings or null
+    vocab_target = data.get("vocab_target")
+    if vocab_target and not isinstance(vocab_target, str):
+        vocab_target = None
+    
+    grammar_target = data.get("grammar_target")
+    if grammar_target and not isinstance(grammar_target, str):
+        grammar_target = None
+    
+    return {
+        "intent": intent,
+        "vocab_target": vocab_target,
+        "grammar_target": grammar_target,
+    }
+
 # Parse user input and return intent + extracted targets
 def analyze_with_llm(user_input: str) -> dict:
-    default_response = {
-        "intent": "general_chat",
-        "vocab_target": None,
-        "grammar_target": None,
-    }
+    raw_response = None
 
     try:
         raw_response = call_llm_fast(SYSTEM_PROMPT_INTENT, user_input)
-        
-        json_text = extract_json_block(raw_response)
-        data = json.loads(json_text)
-        
-        # Validate intent value
-        valid_intents = ["vocab_lookup", "grammar_correction", "general_chat"]
-        intent = data.get("intent", "general_chat")
-        if intent not in valid_intents:
-            intent = "general_chat"
-        
-        # Ensure targets are strings or null
-        vocab_target = data.get("vocab_target")
-        if vocab_target and not isinstance(vocab_target, str):
-            vocab_target = None
-        
-        grammar_target = data.get("grammar_target")
-        if grammar_target and not isinstance(grammar_target, str):
-            grammar_target = None
-        
-        return {
-            "intent": intent,
-            "vocab_target": vocab_target,
-            "grammar_target": grammar_target,
-        }
+        result = parse_intent_response(raw_response)
+        log_intent_example(user_input, result)
+        return result
     
     except json.JSONDecodeError as e:
         print(f"JSON parsing failed: {e}")
         print(f"Raw response: {raw_response}")
-        return default_response
+        return dict(DEFAULT_INTENT)
     except Exception as e:
         print(f"Intent analysis error: {e}")
-        return default_response
\ No newline at end of file
+        return dict(DEFAULT_INTENT)
+
+
+async def analyze_with_llm_async(user_input: str) -> dict:
+    raw_response = None
+
+    try:
+        raw_response = await call_llm_fast_async(SYSTEM_PROMPT_INTENT, user_input)
+        result = parse_intent_response(raw_response)
+        log_intent_example(user_input, result)
+        return result
+    
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing failed: {e}")
+        print(f"Raw response: {raw_response}")
+        return dict(DEFAULT_INTENT)
+    except Exception as e:
+        print(f"Intent analysis error: {e}")
+        return dict(DEFAULT_INTENT)
+
+
+# Fraction of local (rule or classifier) hits that are also sent to the LLM in the background to measure agreement
+INTENT_SHADOW_RATE = float(os.environ.get("INTENT_SHADOW_RATE", "0.1"))
+SHADOW_DISAGREEMENTS_KEPT = 20
+
+# Trained by `python intent_classifier.py`; until a model exists every non-rule message goes to the LLM
+intent_classifier = IntentClassifier()
+
+_intent_stats = {
+    "requests": 0,
+    "fast_path_hits": 0,
+    "rule_hits": 0,
+    "classifier_hits": 0,
+    "llm_fallbacks": 0,
+    "shadow_compared": 0,
+    "shadow_intent_agreed": 0,
+    "shadow_target_agreed": 0,
+}
+_shadow_disagreements = deque(maxlen=SHADOW_DISAGREEMENTS_KEPT)
+_shadow_tasks = set()
+
+
+def _target_of(result: dict):
+    target = result.get("vocab_target") or result.get("grammar_target") or ""
+    return target.strip().strip("\"'").lower()
+
+
+# Compare a local decision against the LLM's, off the request path
+async def _shadow_compare(user_input: str, fast_result: dict, source: str):
+    try:
+        raw_response = await call_llm_fast_async(SYSTEM_PROMPT_INTENT, user_input, priority=BACKGROUND)
+        llm_result = parse_intent_response(raw_response)
+        log_intent_example(user_input, llm_result)
+    except Exception as e:
+        print(f"Shadow intent analysis error: {e}")
+        return
+
+    _intent_stats["shadow_compared"] += 1
+    intent_agreed = llm_result["intent"] == fast_result["intent"]
+    target_agreed = intent_agreed and _target_of(llm_result) == _target_of(fast_result)
+
+    if intent_agreed:
+        _intent_stats["shadow_intent_agreed"] += 1
+    if target_agreed:
+        _intent_stats["shadow_target_agreed"] += 1
+    else:
+        _shadow_disagreements.append({"message": user_input, "source": source, "local": fast_result, "llm": llm_result})
+
+
+# Local rules, then the trained classifier; None means the message needs the LLM
+async def local_intent_async(user_input: str):
+    _intent_stats["requests"] += 1
+
+    fast_result = classify_intent(user_input)
+    source = "rules"
+    if fast_result is None:
+        fast_result = await asyncio.to_thread(intent_classifier.classify, user_input)
+        source = "classifier"
+
+    if fast_result is None:
+        _intent_stats["llm_fallbacks"] += 1
+        return None
+
+    _intent_stats["fast_path_hits"] += 1
+    _intent_stats["rule_hits" if source == "rules" else "classifier_hits"] += 1
+    if random.random() < INTENT_SHADOW_RATE:
+        task = asyncio.ensure_future(_shadow_compare(user_input, dict(fast_result), source))
+        _shadow_tasks.add(task)
+        task.add_done_callback(_shadow_tasks.discard)
+
+    return fast_result
+
+
+# Fast-path hit rate and, in shadow mode, how often local results agree with the LLM
+def intent_stats() -> dict:
+    stats = dict(_intent_stats)
+    requests = stats["requests"]
+    compared = stats["shadow_compared"]
+
+    stats["fast_path_rate"] = stats["fast_path_hits"] / requests if requests else 0.0
+    stats["shadow_intent_agreement"] = stats["shadow_intent_agreed"] / compared if compared else None
+    stats["shadow_target_agreement"] = stats["shadow_target_agreed"] / compared if compared else None
+    stats["shadow_rate"] = INTENT_SHADOW_RATE
+    stats["classifier_loaded"] = intent_classifier.pipeline is not None
+    stats["recent_disagreements"] = list(_shadow_disagreements)
+    return stats
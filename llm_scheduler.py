@@ -0,0 +1,275 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Request priorities; lower runs first when a model's pool is saturated
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Retry backoff: base * 2^attempt, scaled by a random factor in [0.5, 1.5)
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 8.0
+
+# Hedging: once this many latencies are recorded, a call still running after the
+# HEDGE_PERCENTILE latency gets a duplicate request; whichever finishes first wins
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# Streaming calls fail once this long passes between two chunks, even within the deadline
+STREAM_CHUNK_TIMEOUT = 30.0
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# Concurrency limit whose waiters are served by priority, then arrival order
+class PriorityLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def try_acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        if self.try_acquire():
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._order), future]
+        heapq.heappush(self._waiters, entry)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self.release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+# Per-model concurrency pools with priority, deadlines, jittered retry and hedged requests
+class LLMScheduler:
+    def __init__(self, pool_sizes: dict, default_timeouts: dict, max_retries: int = 2,
+                 hedging: bool = True, is_retryable=None):
+        self.pools = {model: PriorityLimiter(size) for model, size in pool_sizes.items()}
+        self.default_timeouts = default_timeouts
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self.is_retryable = is_retryable or (lambda e: False)
+
+        self.latency = {model: LatencyTracker() for model in pool_sizes}
+        self.stats = {
+            model: {
+                "calls": 0,
+                "failures": 0,
+                "retries": 0,
+                "timeouts": 0,
+                "hedges": 0,
+                "hedge_wins": 0,
+                "queue_wait_seconds_total": 0.0,
+            }
+            for model in pool_sizes
+        }
+
+    async def _acquire(self, model: str, priority: int):
+        start = time.perf_counter()
+        await self.pools[model].acquire(priority)
+        self.stats[model]["queue_wait_seconds_total"] += time.perf_counter() - start
+
+    async def _attempt(self, model: str, make_call, priority: int, acquired: bool = False):
+        if not acquired:
+            await self._acquire(model, priority)
+        try:
+            start = time.perf_counter()
+            result = await make_call()
+            self.latency[model].record(time.perf_counter() - start)
+            return result
+        finally:
+            self.pools[model].release()
+
+    # One attempt, plus a duplicate if it runs past the hedge threshold and a slot is free
+    async def _hedged_attempt(self, model: str, make_call, priority: int):
+        primary = asyncio.ensure_future(self._attempt(model, make_call, priority))
+
+        threshold = None
+        if self.hedging and len(self.latency[model].samples) >= HEDGE_MIN_SAMPLES:
+            threshold = self.latency[model].percentile(HEDGE_PERCENTILE)
+
+        if threshold is None:
+            return await primary
+
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=threshold)
+            if done or not self.pools[model].try_acquire():
+                return await primary
+
+            # The hedge only runs if a slot is free right now; it never queues
+            self.stats[model]["hedges"] += 1
+            hedge = asyncio.ensure_future(self._attempt(model, make_call, priority, acquired=True))
+            tasks.append(hedge)
+
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats[model]["hedge_wins"] += 1
+                        for other in pending:
+                            other.cancel()
+                        return task.result()
+
+            # Both failed; surface the primary's error
+            return primary.result()
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    # Run make_call() (a coroutine factory) under the model's pool and the call's deadline
+    async def run(self, model: str, make_call, priority: int = INTERACTIVE, timeout: float | None = None):
+        stats = self.stats[model]
+        stats["calls"] += 1
+
+        timeout = timeout if timeout is not None else self.default_timeouts.get(model)
+        deadline = time.monotonic() + timeout if timeout else None
+        attempt = 0
+
+        while True:
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                stats["timeouts"] += 1
+                stats["failures"] += 1
+                raise DeadlineExceeded(f"{model} call exceeded {timeout}s deadline")
+
+            try:
+                return await asyncio.wait_for(self._hedged_attempt(model, make_call, priority), remaining)
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                stats["failures"] += 1
+                raise DeadlineExceeded(f"{model} call exceeded {timeout}s deadline")
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    stats["failures"] += 1
+                    raise
+
+            attempt += 1
+            stats["retries"] += 1
+            backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5)
+            if deadline:
+                backoff = min(backoff, max(0.0, deadline - time.monotonic()))
+            await asyncio.sleep(backoff)
+
+    # Yield the chunks of a streaming call (open_stream is a coroutine factory returning an
+    # async iterator) while holding a pool slot. Queueing, opening the stream and every chunk
+    # count against the model's deadline; after the first chunk, each gap is also capped
+    # at chunk_timeout. Streams are not retried or hedged, since chunks may already be out.
+    async def stream(self, model: str, open_stream, priority: int = INTERACTIVE, timeout: float | None = None,
+                     chunk_timeout: float = STREAM_CHUNK_TIMEOUT):
+        stats = self.stats[model]
+        stats["calls"] += 1
+
+        timeout = timeout if timeout is not None else self.default_timeouts.get(model)
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def remaining(cap=None):
+            if deadline is None:
+                return cap
+            left = max(0.0, deadline - time.monotonic())
+            return left if cap is None else min(left, cap)
+
+        try:
+            await asyncio.wait_for(self._acquire(model, priority), remaining())
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            stats["failures"] += 1
+            raise DeadlineExceeded(f"{model} stream exceeded {timeout}s deadline")
+
+        stream = None
+        try:
+            start = time.perf_counter()
+            stream = await asyncio.wait_for(open_stream(), remaining())
+            chunks = stream.__aiter__()
+            first = True
+
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining(None if first else chunk_timeout))
+                except StopAsyncIteration:
+                    break
+                first = False
+                yield chunk
+
+            self.latency[model].record(time.perf_counter() - start)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            stats["failures"] += 1
+            raise DeadlineExceeded(f"{model} stream exceeded its {timeout}s deadline or {chunk_timeout}s between chunks")
+        except Exception:
+            stats["failures"] += 1
+            raise
+        finally:
+            self.pools[model].release()
+            # Drop the upstream connection of an abandoned or timed-out stream
+            if stream is not None and hasattr(stream, "close"):
+                await stream.close()
+
+    def get_stats(self):
+        result = {}
+        for model, stats in self.stats.items():
+            pool = self.pools[model]
+            latency = self.latency[model]
+            result[model] = {
+                **stats,
+                "active": pool.active,
+                "queued": pool.queued,
+                "limit": pool.limit,
+                "p50_seconds": latency.percentile(50),
+                "p95_seconds": latency.percentile(95),
+                "p99_seconds": latency.percentile(99),
+            }
+        return result
+
@@ -1,16 +1,47 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
-from llm_intent import analyze_with_llm
-from vocab_handler import handle_vocab, handle_vocab_with_target
-from grammar_handler import handle_grammar, handle_grammar_with_target
-from client import call_llm
-from learning_profile import build_learning_profile, record_quiz_result, record_quiz_session, get_quiz_history
-from chat_manager import list_sessions, create_new_session, load_session, append_message, delete_session
-from quiz import generate_quiz, generate_explanation
-
-app = FastAPI()
+from llm_intent import local_intent_async, analyze_with_llm_async, intent_stats
+from vocab_handler import vocab_prompt_async, NO_VOCAB_TARGET_REPLY
+from grammar_handler import grammar_reply_async, document_prompt_async, extract_grammar_target, is_document
+from client import call_llm_async, stream_llm_async, close_async_client, llm_cache_stats, llm_flight_stats, llm_scheduler_stats
+from learning_profile import build_learning_profile_async, record_quiz_result, record_quiz_session, get_quiz_history
+from chat_manager import list_sessions, create_new_session, load_session, load_session_window, append_message, delete_session, count_user_messages
+from chat_manager import start_session_flusher, close_sessions, session_cache_stats
+from quiz import generate_quiz, generate_explanation_async
+from speculation import Speculation, speculation_stats
+from grammar_inference import grammar_batch_stats, correction_cache_stats, precheck_stats
+from inference_pool import start_inference_pool, close_inference_pool, inference_pool_stats, InferencePoolBusy
+from warmup import start_warmup, readiness
+
+# Heavy libraries (torch, transformers, scikit-learn) are imported when their component loads
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+# The inference pool's fork server is launched first, before any other thread exists. Models,
+# the vocab index and the pool's workers then load in the background, so the server answers
+# requests right away; then start the session write-back flusher. Drain both on shutdown.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"Imported app in {IMPORT_SECONDS:.2f}s")
+    start_inference_pool()
+    start_warmup()
+    start_session_flusher()
+    yield
+    close_sessions()
+    close_inference_pool()
+    await close_async_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +51,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Every inference worker busy for INFERENCE_QUEUE_TIMEOUT: ask the client to retry
+@app.exception_handler(InferencePoolBusy)
+async def inference_busy_handler(request: Request, exc: InferencePoolBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "The server is busy. Please try again in a moment."},
+        headers={"Retry-After": "5"},
+    )
+
 # API request models
 class ChatRequest(BaseModel):
     session_id: str
@@ -59,78 +99,212 @@ def new_session():
     return {"session_id": session_id}
 
 
+# Whole session by default; `limit` returns the last N messages and `before` pages back from first_index
 @app.get("/sessions/{session_id}")
-def get_session_data(session_id: str):
-    data = load_session(session_id)
+def get_session_data(session_id: str, limit: int | None = Query(None, ge=1), before: int | None = Query(None, ge=0)):
+    if limit is None and before is None:
+        data = load_session(session_id)
+    else:
+        data = load_session_window(session_id, limit, before)
+
     if data is None:
         return {"error": "Session not found"}
     return data
 
 
-@app.post("/chat")
-def chat_endpoint(req: ChatRequest):
-    session_id = req.session_id
-    user_input = req.message.strip()
-
-    session_data = load_session(session_id)
-    if session_data is None:
-        return {"error": "Invalid session_id"}
-
-    append_message(session_id, "user", user_input)
+SYSTEM_PROMPT_CHAT = """
+English-learning assistant. Be simple and clear.
+Only correct/explain grammar when asked.
+"""
 
-    analysis = analyze_with_llm(user_input)
+# Start T5 correction and vocab lookup while the LLM intent call is in flight (SPECULATIVE_EXECUTION=1)
+SPECULATIVE_EXECUTION = os.environ.get("SPECULATIVE_EXECUTION", "0") == "1"
+
+# Route by intent to the final LLM call as (system prompt, user prompt, use_cache, preamble, on_answer),
+# or to a fixed reply when no LLM call is needed. The preamble (e.g. a corrected essay) goes
+# before the LLM's answer, and on_answer, if set, receives the complete answer.
+# Free-form chat answers are never cached. on_event receives the structured grammar
+# results ({"edits": ...}, or {"sentence": ...} per document sentence) as soon as they exist;
+# with stream_draft it also receives the draft correction ({"correction_delta": ...}) as it is generated.
+async def resolve_reply(user_input: str, analysis: dict, speculation: Speculation | None = None,
+                        on_event=None, stream_draft: bool = False):
     intent = analysis.get("intent", "general_chat")
 
     vocab_target = analysis.get("vocab_target")
     grammar_target = analysis.get("grammar_target")
 
-    # Route to appropriate handler based on intent
     if intent == "vocab_lookup":
-        answer = handle_vocab_with_target(user_input, vocab_target) if vocab_target else handle_vocab(user_input)
+        prompt = await vocab_prompt_async(user_input, vocab_target, speculation)
+        return (*prompt, True, "", None) if prompt is not None else NO_VOCAB_TARGET_REPLY
     elif intent == "grammar_correction":
-        answer = handle_grammar_with_target(user_input, grammar_target) if grammar_target else handle_grammar(user_input)
+        grammar_target = grammar_target or extract_grammar_target(user_input)
+        if is_document(grammar_target):
+            on_sentence = (lambda sentence: on_event({"sentence": sentence})) if on_event else None
+            reply = await document_prompt_async(grammar_target, on_sentence)
+            if isinstance(reply, str):
+                return reply
+            system_prompt, user_prompt, preamble = reply
+            return system_prompt, user_prompt, True, preamble, None
+
+        return await grammar_reply_async(grammar_target, speculation, on_event, stream_draft)
     else:
-        system_prompt_chat = """
-English-learning assistant. Be simple and clear.
-Only correct/explain grammar when asked.
-"""
-        answer = call_llm(system_prompt_chat, user_input)
+        return SYSTEM_PROMPT_CHAT, user_input, False, "", None
 
-    answer = answer.strip()
+
+# Intent analysis followed by routing; local intents skip the LLM call and need no speculation
+async def analyze_and_resolve(user_input: str, on_event=None, stream_draft: bool = False):
+    analysis = await local_intent_async(user_input)
+    if analysis is not None:
+        return await resolve_reply(user_input, analysis, on_event=on_event, stream_draft=stream_draft)
+
+    if not SPECULATIVE_EXECUTION:
+        analysis = await analyze_with_llm_async(user_input)
+        return await resolve_reply(user_input, analysis, on_event=on_event, stream_draft=stream_draft)
+
+    speculation = Speculation(user_input)
+    try:
+        analysis = await analyze_with_llm_async(user_input)
+        speculation.analysis_done()
+        return await resolve_reply(user_input, analysis, speculation, on_event, stream_draft)
+    finally:
+        speculation.close()
+
+
+def record_reply(session_id: str, answer: str):
     append_message(session_id, "assistant", answer)
     
     # Invalidate profile cache every 5 messages to keep it fresh
-    all_sessions = list_sessions()
-    total_user_messages = 0
-    
-    for session_info in all_sessions:
-        sid = session_info["session_id"]
-        if sid == "quiz_session":
-            continue
-        session = load_session(sid)
-        if session:
-            messages = session.get("messages", [])
-            total_user_messages += sum(1 for msg in messages if msg.get("role") == "user")
-    
-    if total_user_messages % 5 == 0:
+    if count_user_messages() % 5 == 0:
         from learning_profile import _profile_cache
         _profile_cache["timestamp"] = None
-    
-    return {"response": answer}
+
+
+@app.post("/chat")
+async def chat_endpoint(req: ChatRequest):
+    session_id = req.session_id
+    user_input = req.message.strip()
+
+    # Session reads and writes can wait on the backend, so they run off the event loop
+    session_data = await asyncio.to_thread(load_session, session_id)
+    if session_data is None:
+        return {"error": "Invalid session_id"}
+
+    await asyncio.to_thread(append_message, session_id, "user", user_input)
+
+    events = []
+    reply = await analyze_and_resolve(user_input, events.append)
+
+    if isinstance(reply, str):
+        answer = reply
+    else:
+        system_prompt, user_prompt, use_cache, preamble, on_answer = reply
+        generated = await call_llm_async(system_prompt, user_prompt, use_cache)
+        if on_answer:
+            on_answer(generated)
+        answer = preamble + generated
+
+    answer = answer.strip()
+    await asyncio.to_thread(record_reply, session_id, answer)
+
+    # Structured edits for highlighting: one sentence, or every sentence of a document
+    response = {"response": answer}
+    for event in events:
+        if "edits" in event:
+            response["edits"] = event["edits"]
+    sentences = sorted((event["sentence"] for event in events if "sentence" in event), key=lambda s: s["index"])
+    if sentences:
+        response["sentences"] = sentences
+    return response
+
+
+def sse_event(data: dict) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Same routing as /chat, but the reply is streamed as server-sent events:
+# {"delta": ...} per chunk, then {"done": true}. For a single sentence the draft correction is
+# streamed first as {"correction_delta": ...} pieces, then the final correction is sent as
+# {"edits": {original, corrected, edits}}; in document mode each corrected sentence is sent as
+# {"sentence": {index, total, original, corrected, edits}}, in the order batches finish.
+# The full text is saved once the stream ends.
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    session_id = req.session_id
+    user_input = req.message.strip()
+
+    session_data = await asyncio.to_thread(load_session, session_id)
+    if session_data is None:
+        return {"error": "Invalid session_id"}
+
+    await asyncio.to_thread(append_message, session_id, "user", user_input)
+
+    async def event_stream():
+        parts = []
+
+        events = asyncio.Queue()
+        resolving = asyncio.ensure_future(analyze_and_resolve(user_input, events.put_nowait, stream_draft=True))
+
+        try:
+            # Forward edits and per-sentence results while routing (and correction) runs
+            while not resolving.done() or not events.empty():
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait({resolving, next_event}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event.done():
+                    yield sse_event(next_event.result())
+                else:
+                    next_event.cancel()
+
+            reply = resolving.result()
+
+            if isinstance(reply, str):
+                parts.append(reply)
+                yield sse_event({"delta": reply})
+            else:
+                system_prompt, user_prompt, use_cache, preamble, on_answer = reply
+                if preamble:
+                    parts.append(preamble)
+                    yield sse_event({"delta": preamble})
+
+                generated = []
+                async for delta in stream_llm_async(system_prompt, user_prompt, use_cache):
+                    generated.append(delta)
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+
+                # Only complete answers are handed on
+                if on_answer:
+                    on_answer("".join(generated))
+
+            yield sse_event({"done": True})
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event({"error": "Something went wrong. Please try again."})
+        finally:
+            # Also runs if the client disconnects mid-stream
+            resolving.cancel()
+            answer = "".join(parts).strip()
+            if answer:
+                await asyncio.to_thread(record_reply, session_id, answer)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/quiz/prepare")
-def quiz_prepare():
-    profile = build_learning_profile()
+async def quiz_prepare():
+    profile = await build_learning_profile_async()
     return {"status": "ready", "profile": profile}
 
 
 @app.post("/quiz/generate")
-def quiz_generate(data: dict):
+async def quiz_generate(data: dict):
     profile = data.get("profile", data)
     
-    # Generate 5 questions from learner profile
-    quiz = generate_quiz({"profile": profile}, 5)
+    # Generate 5 questions from learner profile (T5 runs in a worker thread)
+    quiz = await asyncio.to_thread(generate_quiz, {"profile": profile}, 5)
 
     if not quiz:
         return {
@@ -138,13 +312,17 @@ def quiz_generate(data: dict):
             "text": "I couldn't generate a quiz right now. Please try again later."
         }
 
-    # Precompute all explanations
-    for q in quiz:
-        q["explanation"] = generate_explanation(
+    # Precompute all explanations concurrently
+    explanations = await asyncio.gather(*[
+        generate_explanation_async(
             q["original_sentence"], 
             q["correct_answer"], 
             q["topic"]
         )
+        for q in quiz
+    ])
+    for q, explanation in zip(quiz, explanations):
+        q["explanation"] = explanation
 
     quiz_sessions["active"] = {
         "questions": quiz,
@@ -236,6 +414,57 @@ def get_history():
     return {"history": get_quiz_history()}
 
 
+@app.get("/stats/session-cache")
+def get_session_cache_stats():
+    return session_cache_stats()
+
+
+@app.get("/stats/llm")
+def get_llm_stats():
+    return {
+        "cache": llm_cache_stats(),
+        "single_flight": llm_flight_stats(),
+        "scheduler": llm_scheduler_stats(),
+    }
+
+
+@app.get("/stats/intent")
+def get_intent_stats():
+    return intent_stats()
+
+
+@app.get("/stats/grammar")
+def get_grammar_stats():
+    return {
+        "batching": grammar_batch_stats(),
+        "correction_cache": correction_cache_stats(),
+        "precheck": precheck_stats(),
+    }
+
+
+# Liveness: the process is up and serving
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+
+# Readiness: every component warmed up (503 until then, with the per-component status)
+@app.get("/readyz")
+def readyz():
+    status = {**readiness(), "import_seconds": round(IMPORT_SECONDS, 3)}
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/stats/inference")
+def get_inference_stats():
+    return inference_pool_stats()
+
+
+@app.get("/stats/speculation")
+def get_speculation_stats():
+    return {"enabled": SPECULATIVE_EXECUTION, **speculation_stats()}
+
+
 @app.post("/profile/invalidate")
 def invalidate_profile():
     from learning_profile import _profile_cache
@@ -0,0 +1,108 @@
+import os
+import json
+import mmap
+import argparse
+import torch
+from transformers import T5Config, T5ForConditionalGeneration
+
+# Zero-copy loading of T5 checkpoints: the tensors of model.safetensors are views of a
+# copy-on-write memory map of the file, so their pages live in the OS page cache and are
+# shared by every process that loads the same model (uvicorn/gunicorn workers, inference
+# pool replicas) instead of being copied into each process's heap
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "1") != "0"
+
+SAFETENSORS_NAME = "model.safetensors"
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+# State dict whose tensors point into the mapped file (8-byte header length, JSON header, data)
+def mmap_safetensors(path: str) -> dict:
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header_size = int.from_bytes(mapped[:8], "little")
+    header = json.loads(mapped[8:8 + header_size])
+    data_start = 8 + header_size
+
+    state_dict = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+
+        if count == 0:
+            state_dict[name] = torch.empty(info["shape"], dtype=dtype)
+        else:
+            # frombuffer keeps the mapping alive for as long as the tensor exists
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin)
+            state_dict[name] = tensor.view(info["shape"])
+
+    return state_dict
+
+
+# Build the model without allocating weights, then adopt the mapped tensors as parameters
+def load_t5_mmap(model_dir: str):
+    config = T5Config.from_pretrained(model_dir)
+    with torch.device("meta"):
+        model = T5ForConditionalGeneration(config)
+
+    state_dict = mmap_safetensors(os.path.join(model_dir, SAFETENSORS_NAME))
+    model.load_state_dict(state_dict, strict=False, assign=True)
+
+    # Encoder/decoder embeddings (and lm_head, if tied) are saved once as shared.weight
+    model.tie_weights()
+
+    missing = [name for name, tensor in model.state_dict().items() if tensor.is_meta]
+    if missing:
+        raise ValueError(f"{model_dir}/{SAFETENSORS_NAME} is missing weights: {', '.join(missing[:5])}")
+
+    model.eval()
+    return model
+
+
+# Memory-mapped when the directory has a safetensors file, otherwise a regular from_pretrained copy
+def load_t5(model_dir: str):
+    if MODEL_MMAP and os.path.exists(os.path.join(model_dir, SAFETENSORS_NAME)):
+        return load_t5_mmap(model_dir)
+
+    model = T5ForConditionalGeneration.from_pretrained(model_dir)
+    model.eval()
+    return model
+
+
+# Rewrite a pytorch_model.bin checkpoint as model.safetensors so it can be memory-mapped
+def convert_to_safetensors(model_dir: str):
+    model = T5ForConditionalGeneration.from_pretrained(model_dir)
+    model.save_pretrained(model_dir, safe_serialization=True)
+
+    legacy = os.path.join(model_dir, "pytorch_model.bin")
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert T5 checkpoints to safetensors for memory-mapped loading")
+    parser.add_argument("model_dirs", nargs="+")
+    args = parser.parse_args()
+
+    for model_dir in args.model_dirs:
+        if os.path.exists(os.path.join(model_dir, SAFETENSORS_NAME)):
+            print(f"{model_dir} already has {SAFETENSORS_NAME}")
+            continue
+        convert_to_safetensors(model_dir)
+        print(f"Converted {model_dir}")
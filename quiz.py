@@ -1,15 +1,32 @@
 import json
 import random
 import difflib
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-from client import call_llm
+import threading
+from client import call_llm, call_llm_async, BACKGROUND
+from inference_pool import run_inference
 
 USER_DATA_PATH = "data/user_data.json"
 NUM_QUESTIONS = 5
 
-# Load fine-tuned T5 model for fill-in-the-blank generation
-tokenizer = T5Tokenizer.from_pretrained("models/checkpoint-91593")
-model = T5ForConditionalGeneration.from_pretrained("models/checkpoint-91593")
+# Fine-tuned T5 model for fill-in-the-blank generation, loaded when first needed
+QUIZ_MODEL_PATH = "models/checkpoint-91593"
+
+tokenizer = None
+model = None
+_load_lock = threading.Lock()
+
+def load_quiz_model():
+    global tokenizer, model
+
+    with _load_lock:
+        if tokenizer is None or model is None:
+            from transformers import T5Tokenizer
+            from model_loading import load_t5
+
+            tokenizer = T5Tokenizer.from_pretrained(QUIZ_MODEL_PATH)
+            model = load_t5(QUIZ_MODEL_PATH)
+
+    return tokenizer, model
 
 # Word pools for each grammar category
 TOPICS = {
@@ -154,12 +171,20 @@ def select_topic(profile):
     weights = list(w.values())
     return random.choices(keys, weights=weights, k=1)[0]
 
-# Generate completed sentence from skeleton with <extra_id_0>
-def fill_blank(sentence):
+def _fill_blank_local(sentence):
+    tokenizer, model = load_quiz_model()
     enc = tokenizer(sentence, return_tensors="pt")
     out = model.generate(**enc, max_new_tokens=32)
     return tokenizer.decode(out[0], skip_special_tokens=True)
 
+# Generate completed sentence from skeleton with <extra_id_0> (in an inference worker when enabled)
+def fill_blank(sentence):
+    return run_inference(_fill_blank_local, sentence)
+
+# Runs in this process (the API process, or an inference worker's initializer)
+def warm_up_quiz_model():
+    _fill_blank_local("I bought <extra_id_0> apple.")
+
 # Find the word that filled the blank position
 def extract_answer(skeleton, corrected):
     sk_tokens = skeleton.split()
@@ -274,9 +299,10 @@ def make_single_mcq(profile):
         "explanation": None
     }
 
-def generate_explanation(original_sentence, answer, topic):
-    system_prompt = "You are an English tutor. Explain grammar clearly and concisely."
-    user_message = f"""
+EXPLANATION_SYSTEM_PROMPT = "You are an English tutor. Explain grammar clearly and concisely."
+
+def build_explanation_prompt(original_sentence, answer, topic):
+    return f"""
 Sentence: {original_sentence}
 Correct answer: {answer}
 Grammar topic: {topic}
@@ -286,7 +312,13 @@ Do NOT use headings, bullet points, or markdown.
 Keep it concise and clear.
 """
 
-    return call_llm(system_prompt, user_message)
+def generate_explanation(original_sentence, answer, topic):
+    user_message = build_explanation_prompt(original_sentence, answer, topic)
+    return call_llm(EXPLANATION_SYSTEM_PROMPT, user_message)
+
+async def generate_explanation_async(original_sentence, answer, topic):
+    user_message = build_explanation_prompt(original_sentence, answer, topic)
+    return await call_llm_async(EXPLANATION_SYSTEM_PROMPT, user_message, priority=BACKGROUND)
 
 # Generate n questions, retry up to 15x per question if generation fails
 def generate_quiz(user, n=5):
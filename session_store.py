@@ -0,0 +1,708 @@
+import os
+import json
+import queue
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+# Default locations for each storage backend
+SESSIONS_DIR = "data/sessions"
+MANIFEST_PATH = "data/session_manifest.json"
+SQLITE_PATH = "data/sessions.db"
+
+# Fold a session's log into its snapshot once the log has this many lines
+COMPACT_THRESHOLD = 50
+
+
+def session_number(session_id: str):
+    prefix, _, number = session_id.rpartition("_")
+    if prefix == "session" and number.isdigit():
+        return int(number)
+    return 0
+
+
+def format_session_id(number: int):
+    return f"session_{number:03d}"
+
+
+# First user message becomes title
+def apply_message(session: dict, role: str, text: str):
+    session["messages"].append({"role": role, "text": text})
+
+    if role == "user" and not session.get("title"):
+        cleaned_text = text.strip()
+        if cleaned_text:
+            session["title"] = cleaned_text[:40]
+
+
+# Window of a full session dict; first_index is the cursor for the next older page
+def slice_session(session: dict, limit: int | None = None, before: int | None = None):
+    messages = session["messages"]
+    total = len(messages)
+
+    end = total if before is None else max(0, min(before, total))
+    start = 0 if limit is None else max(0, end - limit)
+
+    return {
+        "session_id": session["session_id"],
+        "created_at": session["created_at"],
+        "title": session.get("title", ""),
+        "messages": messages[start:end],
+        "total_messages": total,
+        "first_index": start,
+        "has_more": start > 0,
+    }
+
+
+# Interface every session storage backend implements.
+# Messages are passed as {"seq", "role", "text"} entries.
+class SessionBackend:
+    # Get all sessions except quiz_session, as id/created_at/title
+    def list_sessions(self):
+        raise NotImplementedError
+
+    # Total user messages across all sessions except quiz_session
+    def count_user_messages(self):
+        raise NotImplementedError
+
+    # Id of the session that received a message most recently
+    def latest_session_id(self):
+        raise NotImplementedError
+
+    # Hand out a session id that is never reused, even after deletes
+    def allocate_session_id(self):
+        raise NotImplementedError
+
+    def create_session(self, session_id: str, created_at: str):
+        raise NotImplementedError
+
+    def read_session(self, session_id: str):
+        raise NotImplementedError
+
+    # Session with only the `limit` messages before index `before` (None means from the end)
+    def read_session_window(self, session_id: str, limit: int | None = None, before: int | None = None):
+        session = self.read_session(session_id)
+        if session is None:
+            return None
+        return slice_session(session, limit, before)
+
+    def append_messages(self, session_id: str, entries: list):
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# JSON snapshot per session plus an append-only JSONL message log and a manifest index
+class JsonSessionBackend(SessionBackend):
+    def __init__(self, sessions_dir: str = SESSIONS_DIR, manifest_path: str = MANIFEST_PATH):
+        self.sessions_dir = sessions_dir
+        self.manifest_path = manifest_path
+        os.makedirs(sessions_dir, exist_ok=True)
+
+        self._locks_guard = threading.Lock()
+        self._session_locks = {}
+        self._log_lengths = {}
+
+        self._manifest_lock = threading.RLock()
+        self._manifest = None
+        self._manifest_mtime = None
+
+        self._compact_queue = queue.Queue()
+        self._compact_pending = set()
+        self._compactor = None
+
+    def session_path(self, session_id: str):
+        return os.path.join(self.sessions_dir, f"{session_id}.json")
+
+    def log_path(self, session_id: str):
+        return os.path.join(self.sessions_dir, f"{session_id}.jsonl")
+
+    def _session_lock(self, session_id: str):
+        with self._locks_guard:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = threading.RLock()
+                self._session_locks[session_id] = lock
+            return lock
+
+    # Log lines carry a sequence number so replay skips anything already compacted
+    def _read_log(self, session_id: str):
+        path = self.log_path(session_id)
+        if not os.path.exists(path):
+            return []
+
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn last line from an interrupted write
+                    continue
+        return entries
+
+    def _write_snapshot(self, session_id: str, data: dict):
+        path = self.session_path(session_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def _manifest_file_mtime(self):
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def session_ids(self):
+        return [
+            filename[:-len(".json")]
+            for filename in sorted(os.listdir(self.sessions_dir))
+            if filename.endswith(".json")
+        ]
+
+    # One-time scan of the sessions directory when no manifest exists yet
+    def _rebuild_manifest(self):
+        sessions = {}
+        user_message_counts = {}
+        next_id = 1
+
+        for session_id in self.session_ids():
+            try:
+                data = self.read_session(session_id)
+                if data is None:
+                    continue
+
+                sessions[data["session_id"]] = {
+                    "session_id": data["session_id"],
+                    "created_at": data["created_at"],
+                    "title": data.get("title", ""),
+                }
+                user_message_counts[data["session_id"]] = sum(
+                    1 for msg in data["messages"] if msg.get("role") == "user"
+                )
+                next_id = max(next_id, session_number(data["session_id"]) + 1)
+            except:
+                continue
+
+        return {
+            "next_id": next_id,
+            "sessions": sessions,
+            "user_message_counts": user_message_counts,
+            "total_user_messages": sum(
+                count for sid, count in user_message_counts.items() if sid != "quiz_session"
+            ),
+        }
+
+    # Kept in memory; one stat per access reloads it if the file was replaced outside this
+    # backend. Only one server process may use the JSON backend (see chat_manager).
+    def _get_manifest(self):
+        with self._manifest_lock:
+            mtime = self._manifest_file_mtime()
+            if self._manifest is None or mtime != self._manifest_mtime:
+                self._manifest = None
+                if mtime is not None:
+                    with open(self.manifest_path, "r", encoding="utf-8") as f:
+                        self._manifest = json.load(f)
+                    self._manifest_mtime = mtime
+
+                # Missing, or written before message counters existed
+                if self._manifest is None or "user_message_counts" not in self._manifest:
+                    next_id = self._manifest["next_id"] if self._manifest else 1
+                    self._manifest = self._rebuild_manifest()
+                    self._manifest["next_id"] = max(self._manifest["next_id"], next_id)
+                    self._save_manifest()
+            return self._manifest
+
+    def next_id(self):
+        with self._manifest_lock:
+            return self._get_manifest()["next_id"]
+
+    def list_sessions(self):
+        with self._manifest_lock:
+            manifest = self._get_manifest()
+            return [
+                dict(entry)
+                for session_id, entry in manifest["sessions"].items()
+                if session_id != "quiz_session"
+            ]
+
+    def count_user_messages(self):
+        with self._manifest_lock:
+            return self._get_manifest()["total_user_messages"]
+
+    # New messages land in the session's log, not the snapshot
+    def latest_session_id(self):
+        latest = None
+
+        for session_id in self.session_ids():
+            if session_id == "quiz_session":
+                continue
+            try:
+                mtime = os.path.getmtime(self.session_path(session_id))
+                if os.path.exists(self.log_path(session_id)):
+                    mtime = max(mtime, os.path.getmtime(self.log_path(session_id)))
+            except:
+                continue
+
+            if latest is None or (mtime, session_id) > latest:
+                latest = (mtime, session_id)
+
+        return latest[1] if latest else None
+
+    def allocate_session_id(self):
+        with self._manifest_lock:
+            manifest = self._get_manifest()
+            next_id = manifest["next_id"]
+
+            while os.path.exists(self.session_path(format_session_id(next_id))):
+                next_id += 1
+
+            manifest["next_id"] = next_id + 1
+            self._save_manifest()
+            return format_session_id(next_id)
+
+    def create_session(self, session_id: str, created_at: str):
+        data = {
+            "session_id": session_id,
+            "created_at": created_at,
+            "messages": [],
+            "title": "",
+        }
+
+        with self._session_lock(session_id):
+            if os.path.exists(self.log_path(session_id)):
+                os.remove(self.log_path(session_id))
+            self._write_snapshot(session_id, data)
+            self._log_lengths[session_id] = 0
+
+        with self._manifest_lock:
+            manifest = self._get_manifest()
+            manifest["sessions"].pop(session_id, None)
+            manifest["sessions"][session_id] = {
+                "session_id": session_id,
+                "created_at": created_at,
+                "title": "",
+            }
+            manifest["next_id"] = max(manifest["next_id"], session_number(session_id) + 1)
+
+            previous_count = manifest["user_message_counts"].pop(session_id, 0)
+            if session_id != "quiz_session":
+                manifest["total_user_messages"] -= previous_count
+            manifest["user_message_counts"][session_id] = 0
+            self._save_manifest()
+
+        return data
+
+    # Rebuild the session dict from the snapshot and any logged messages
+    def read_session(self, session_id: str):
+        filepath = self.session_path(session_id)
+
+        with self._session_lock(session_id):
+            if not os.path.exists(filepath):
+                return None
+
+            with open(filepath, "r", encoding="utf-8") as f:
+                session = json.load(f)
+
+            entries = self._read_log(session_id)
+            for entry in entries:
+                if entry.get("seq", 0) < len(session["messages"]):
+                    continue
+                apply_message(session, entry["role"], entry["text"])
+
+            self._log_lengths[session_id] = len(entries)
+
+        return session
+
+    # Append log entries as one line each and update the manifest counters
+    def append_messages(self, session_id: str, entries: list):
+        with self._session_lock(session_id):
+            if not os.path.exists(self.session_path(session_id)):
+                return
+
+            lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            with open(self.log_path(session_id), "a", encoding="utf-8") as f:
+                f.write(lines)
+
+            self._log_lengths[session_id] = self._log_lengths.get(session_id, 0) + len(entries)
+            needs_compaction = self._log_lengths[session_id] >= COMPACT_THRESHOLD
+
+        user_texts = [entry["text"] for entry in entries if entry["role"] == "user"]
+        if user_texts:
+            with self._manifest_lock:
+                manifest = self._get_manifest()
+                entry = manifest["sessions"].get(session_id)
+
+                if entry is not None and not entry.get("title"):
+                    for text in user_texts:
+                        if text.strip():
+                            entry["title"] = text.strip()[:40]
+                            break
+
+                counts = manifest["user_message_counts"]
+                counts[session_id] = counts.get(session_id, 0) + len(user_texts)
+                if session_id != "quiz_session":
+                    manifest["total_user_messages"] += len(user_texts)
+                self._save_manifest()
+
+        if needs_compaction:
+            self._schedule_compaction(session_id)
+
+    # Fold the log into a fresh snapshot and drop the log
+    def compact_session(self, session_id: str):
+        with self._session_lock(session_id):
+            session = self.read_session(session_id)
+            if session is None:
+                return False
+
+            self._write_snapshot(session_id, session)
+
+            if os.path.exists(self.log_path(session_id)):
+                os.remove(self.log_path(session_id))
+            self._log_lengths[session_id] = 0
+
+        return True
+
+    def _compactor_loop(self):
+        while True:
+            session_id = self._compact_queue.get()
+            with self._locks_guard:
+                self._compact_pending.discard(session_id)
+            try:
+                self.compact_session(session_id)
+            except Exception as e:
+                print(f"Session compaction failed for {session_id}: {e}")
+            finally:
+                self._compact_queue.task_done()
+
+    def _schedule_compaction(self, session_id: str):
+        with self._locks_guard:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(
+                    target=self._compactor_loop, name="session-compactor", daemon=True
+                )
+                self._compactor.start()
+
+            if session_id in self._compact_pending:
+                return
+            self._compact_pending.add(session_id)
+
+        self._compact_queue.put(session_id)
+
+    def delete_session(self, session_id: str):
+        with self._session_lock(session_id):
+            filepath = self.session_path(session_id)
+
+            if not os.path.exists(filepath):
+                return False
+
+            os.remove(filepath)
+            if os.path.exists(self.log_path(session_id)):
+                os.remove(self.log_path(session_id))
+
+        with self._manifest_lock:
+            manifest = self._get_manifest()
+            manifest["sessions"].pop(session_id, None)
+
+            removed_count = manifest["user_message_counts"].pop(session_id, 0)
+            if session_id != "quiz_session":
+                manifest["total_user_messages"] -= removed_count
+            self._save_manifest()
+
+        with self._locks_guard:
+            self._session_locks.pop(session_id, None)
+        self._log_lengths.pop(session_id, None)
+        return True
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    message_count INTEGER NOT NULL DEFAULT 0,
+    user_message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('next_id', 1);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('total_user_messages', 0);
+"""
+
+
+# SQLite database in WAL mode, safe for several workers writing at once
+class SqliteSessionBackend(SessionBackend):
+    def __init__(self, db_path: str = SQLITE_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    # Run fn(conn) inside one write transaction, taking the write lock up front
+    def _write(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def _counter(self, conn, name: str):
+        return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()["value"]
+
+    def list_sessions(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, created_at, title FROM sessions "
+                "WHERE session_id != 'quiz_session' ORDER BY rowid"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_user_messages(self):
+        with self._lock:
+            return self._counter(self._conn, "total_user_messages")
+
+    def latest_session_id(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id FROM sessions WHERE session_id != 'quiz_session' "
+                "ORDER BY updated_at DESC LIMIT 1"
+            ).fetchone()
+        return row["session_id"] if row else None
+
+    def allocate_session_id(self):
+        def allocate(conn):
+            next_id = self._counter(conn, "next_id")
+            while conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (format_session_id(next_id),)
+            ).fetchone():
+                next_id += 1
+            conn.execute("UPDATE counters SET value = ? WHERE name = 'next_id'", (next_id + 1,))
+            return format_session_id(next_id)
+
+        return self._write(allocate)
+
+    def create_session(self, session_id: str, created_at: str):
+        def create(conn):
+            self._delete(conn, session_id)
+            conn.execute(
+                "INSERT INTO sessions (session_id, created_at, updated_at) VALUES (?, ?, ?)",
+                (session_id, created_at, created_at),
+            )
+            conn.execute(
+                "UPDATE counters SET value = MAX(value, ?) WHERE name = 'next_id'",
+                (session_number(session_id) + 1,),
+            )
+
+        self._write(create)
+        return {
+            "session_id": session_id,
+            "created_at": created_at,
+            "messages": [],
+            "title": "",
+        }
+
+    def read_session(self, session_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, created_at, title FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            messages = self._conn.execute(
+                "SELECT role, text FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+
+        return {
+            "session_id": row["session_id"],
+            "created_at": row["created_at"],
+            "messages": [{"role": m["role"], "text": m["text"]} for m in messages],
+            "title": row["title"],
+        }
+
+    # Reads only the requested slice using the (session_id, seq) primary key
+    def read_session_window(self, session_id: str, limit: int | None = None, before: int | None = None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, created_at, title, message_count FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            total = row["message_count"]
+            end = total if before is None else max(0, min(before, total))
+            start = 0 if limit is None else max(0, end - limit)
+
+            messages = self._conn.execute(
+                "SELECT role, text FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start, end),
+            ).fetchall()
+
+        return {
+            "session_id": row["session_id"],
+            "created_at": row["created_at"],
+            "title": row["title"],
+            "messages": [{"role": m["role"], "text": m["text"]} for m in messages],
+            "total_messages": total,
+            "first_index": start,
+            "has_more": start > 0,
+        }
+
+    # Sequence numbers are assigned inside the transaction so concurrent workers never collide
+    def append_messages(self, session_id: str, entries: list):
+        def append(conn):
+            row = conn.execute(
+                "SELECT title, message_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return
+
+            title = row["title"]
+            seq = row["message_count"]
+            user_count = 0
+
+            for entry in entries:
+                conn.execute(
+                    "INSERT INTO messages (session_id, seq, role, text) VALUES (?, ?, ?, ?)",
+                    (session_id, seq, entry["role"], entry["text"]),
+                )
+                seq += 1
+
+                if entry["role"] == "user":
+                    user_count += 1
+                    if not title and entry["text"].strip():
+                        title = entry["text"].strip()[:40]
+
+            conn.execute(
+                "UPDATE sessions SET title = ?, message_count = ?, "
+                "user_message_count = user_message_count + ?, updated_at = ? WHERE session_id = ?",
+                (title, seq, user_count, datetime.now().isoformat(), session_id),
+            )
+            if user_count and session_id != "quiz_session":
+                conn.execute(
+                    "UPDATE counters SET value = value + ? WHERE name = 'total_user_messages'",
+                    (user_count,),
+                )
+
+        self._write(append)
+
+    def _delete(self, conn, session_id: str):
+        row = conn.execute(
+            "SELECT user_message_count FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return False
+
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        if session_id != "quiz_session":
+            conn.execute(
+                "UPDATE counters SET value = value - ? WHERE name = 'total_user_messages'",
+                (row["user_message_count"],),
+            )
+        return True
+
+    def delete_session(self, session_id: str):
+        return self._write(lambda conn: self._delete(conn, session_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# One-shot copy of every JSON session into the SQLite database; sessions already there are skipped
+def migrate_json_to_sqlite(sessions_dir: str = SESSIONS_DIR, manifest_path: str = MANIFEST_PATH,
+                           db_path: str = SQLITE_PATH):
+    source = JsonSessionBackend(sessions_dir, manifest_path)
+    target = SqliteSessionBackend(db_path)
+    migrated = 0
+
+    try:
+        for session_id in source.session_ids():
+            session = source.read_session(session_id)
+            if session is None:
+                continue
+
+            exists = target._conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if exists:
+                continue
+
+            target.create_session(session_id, session["created_at"])
+            entries = [
+                {"seq": seq, "role": msg["role"], "text": msg["text"]}
+                for seq, msg in enumerate(session["messages"])
+            ]
+            if entries:
+                target.append_messages(session_id, entries)
+
+            # Keep the original title and last-activity time rather than the migration's
+            mtime = os.path.getmtime(source.session_path(session_id))
+            if os.path.exists(source.log_path(session_id)):
+                mtime = max(mtime, os.path.getmtime(source.log_path(session_id)))
+            target._write(lambda conn: conn.execute(
+                "UPDATE sessions SET title = ?, updated_at = ? WHERE session_id = ?",
+                (session.get("title", ""), datetime.fromtimestamp(mtime).isoformat(), session_id),
+            ))
+            migrated += 1
+
+        next_id = source.next_id()
+        target._write(lambda conn: conn.execute(
+            "UPDATE counters SET value = MAX(value, ?) WHERE name = 'next_id'", (next_id,)
+        ))
+    finally:
+        target.close()
+
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy JSON chat sessions into the SQLite session store")
+    parser.add_argument("--sessions-dir", default=SESSIONS_DIR)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--db", default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    count = migrate_json_to_sqlite(args.sessions_dir, args.manifest, args.db)
+    print(f"Migrated {count} sessions into {args.db}")
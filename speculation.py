@@ -0,0 +1,130 @@
+import re
+import time
+import asyncio
+from grammar_inference import correct_grammar
+from grammar_handler import GRAMMAR_PATTERNS, extract_grammar_target, is_document
+from vocab_handler import VOCAB_PATTERNS, extract_vocab_target, find_vocab_entries
+
+# Speculative local work for /chat: while the LLM intent call is in flight, the T5
+# correction and the dictionary lookup start on the targets the regex extractors find.
+# Results are reused only if the analysis asks for the same target; the rest is discarded.
+# Nothing is started unless a grammar or vocab pattern matches, and documents are
+# corrected sentence by sentence, so they are never speculated.
+
+_speculation_stats = {
+    "speculations": 0,
+    "grammar_used": 0,
+    "grammar_discarded": 0,
+    "vocab_used": 0,
+    "vocab_discarded": 0,
+    "latency_saved_seconds_total": 0.0,
+    "wasted_seconds_total": 0.0,
+}
+
+
+# Grammar target of a correction request that is a single sentence, else None
+def _grammar_target(user_input: str):
+    if not any(re.search(pattern, user_input, flags=re.IGNORECASE | re.DOTALL) for pattern in GRAMMAR_PATTERNS):
+        return None
+    target = extract_grammar_target(user_input)
+    return None if is_document(target) else target
+
+
+def _vocab_target(user_input: str):
+    lower = user_input.strip().lower()
+    if not any(re.search(pattern, lower) for pattern in VOCAB_PATTERNS):
+        return None
+    return extract_vocab_target(user_input)
+
+
+# Dictionary lookups ignore case, so vocab targets match case-insensitively
+def _same_target(kind: str, speculative_target: str, target: str):
+    if kind == "vocab":
+        return speculative_target.casefold() == target.strip().casefold()
+    return speculative_target == target.strip()
+
+
+def _timed(fn, arg):
+    start = time.perf_counter()
+    result = fn(arg)
+    return result, time.perf_counter() - start
+
+
+class Speculation:
+    def __init__(self, user_input: str):
+        _speculation_stats["speculations"] += 1
+        self.started = time.perf_counter()
+        self.analysis_seconds = None
+        self.tasks = {}
+
+        grammar_target = _grammar_target(user_input)
+        if grammar_target:
+            self._start("grammar", grammar_target, correct_grammar)
+
+        vocab_target = _vocab_target(user_input)
+        if vocab_target:
+            self._start("vocab", vocab_target, find_vocab_entries)
+
+    def _start(self, kind: str, target: str, fn):
+        task = asyncio.ensure_future(asyncio.to_thread(_timed, fn, target))
+        self.tasks[kind] = (target, task)
+
+    # Called when the intent analysis returns; the overlap up to here is the time saved
+    def analysis_done(self):
+        self.analysis_seconds = time.perf_counter() - self.started
+
+    # The worker thread cannot be interrupted, so its full run time counts as waste
+    def _discard(self, kind: str, task):
+        _speculation_stats[f"{kind}_discarded"] += 1
+
+        def record(done):
+            if not done.cancelled() and done.exception() is None:
+                _speculation_stats["wasted_seconds_total"] += done.result()[1]
+
+        task.add_done_callback(record)
+
+    async def _take(self, kind: str, target: str):
+        entry = self.tasks.pop(kind, None)
+        if entry is None:
+            return None
+
+        speculative_target, task = entry
+        if not _same_target(kind, speculative_target, target):
+            self._discard(kind, task)
+            return None
+
+        try:
+            result, seconds = await task
+        except Exception as e:
+            print(f"Speculative {kind} failed: {e}")
+            return None
+
+        _speculation_stats[f"{kind}_used"] += 1
+        if self.analysis_seconds is not None:
+            _speculation_stats["latency_saved_seconds_total"] += min(self.analysis_seconds, seconds)
+        return result
+
+    # Corrected sentence if it was speculated for this exact sentence, else None
+    async def take_grammar(self, sentence: str):
+        return await self._take("grammar", sentence)
+
+    # Dictionary entries if they were speculated for this target (in any case), else None
+    async def take_vocab(self, target: str):
+        return await self._take("vocab", target)
+
+    # Discard whatever the reply did not use
+    def close(self):
+        for kind, (_, task) in self.tasks.items():
+            self._discard(kind, task)
+        self.tasks.clear()
+
+
+# Time saved on requests that used speculative work vs. worker time spent on discarded work
+def speculation_stats() -> dict:
+    stats = dict(_speculation_stats)
+    used = stats["grammar_used"] + stats["vocab_used"]
+    discarded = stats["grammar_discarded"] + stats["vocab_discarded"]
+
+    stats["use_rate"] = used / (used + discarded) if used + discarded else 0.0
+    stats["avg_latency_saved_ms"] = stats["latency_saved_seconds_total"] * 1000 / used if used else 0.0
+    return stats
@@ -1,9 +1,34 @@
 import re
-from vocab_store import VocabStore
+import asyncio
+import threading
 from client import call_llm
 
-# Load vocab database on module import
-store = VocabStore("data/vocab_data.json")
+# Vocab database; the TF-IDF index is built on first use (or by the startup warm-up)
+VOCAB_DATA_PATH = "data/vocab_data.json"
+
+store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global store
+
+    with _store_lock:
+        if store is None:
+            from vocab_store import VocabStore
+            store = VocabStore(VOCAB_DATA_PATH)
+
+    return store
+
+# Regex patterns to detect vocabulary questions (matched against lowercased input)
+VOCAB_PATTERNS = [
+    r"what does\s+(.+?)\s+mean",
+    r"what is the meaning of\s+(.+?)(?:\?|$)",
+    r"what's the meaning of\s+(.+?)(?:\?|$)",
+    r"what is the definition of\s+(.+?)(?:\?|$)",
+    r"definition of\s+(.+?)(?:\?|$)",
+    r"meaning of\s+(.+?)(?:\?|$)",
+    r"what does the word\s+(.+?)\s+mean",
+]
 
 # Extract target word from question (quotes take priority)
 def extract_vocab_target(user_input: str):
@@ -14,17 +39,7 @@ def extract_vocab_target(user_input: str):
     if quoted:
         return quoted.group(1).strip()
 
-    patterns = [
-        r"what does\s+(.+?)\s+mean",
-        r"what is the meaning of\s+(.+?)(?:\?|$)",
-        r"what's the meaning of\s+(.+?)(?:\?|$)",
-        r"what is the definition of\s+(.+?)(?:\?|$)",
-        r"definition of\s+(.+?)(?:\?|$)",
-        r"meaning of\s+(.+?)(?:\?|$)",
-        r"what does the word\s+(.+?)\s+mean",
-    ]
-
-    for pattern in patterns:
+    for pattern in VOCAB_PATTERNS:
         match = re.search(pattern, lower)
         if match:
             return match.group(1).strip()
@@ -50,7 +65,7 @@ Rules: No markdown, no phonetics, no translations. Fill all fields.
 
 
 def find_vocab_entries(target: str):
-    return store.smart_search(target)
+    return get_store().smart_search(target)
 
 # Pick best entry: highest similarity score, or common POS (noun/verb), or first
 def extract_best_entry(entries):
@@ -76,13 +91,10 @@ def extract_best_entry(entries):
     
     return entries[0]
 
-# Search dictionary and generate formatted explanation with LLM
-def handle_vocab_core(user_input: str, target: str) -> str:
-    entries = find_vocab_entries(target)
-
+# Search dictionary and build the user prompt for the explanation LLM call
+def build_vocab_prompt(target: str, entries) -> str:
     if not entries:
-        prompt = f"Target: {target}\n\nDictionary data: NONE"
-        return call_llm(SYSTEM_PROMPT_VOCAB, prompt)
+        return f"Target: {target}\n\nDictionary data: NONE"
 
     entry = extract_best_entry(entries)
     examples = entry.get("examples", [])
@@ -96,7 +108,7 @@ def handle_vocab_core(user_input: str, target: str) -> str:
         if score < 1.0 and target.lower() != entry["word"].lower():
             similarity_note = f"\n\n(Note: Showing '{entry['word']}' as a related word to '{target}')"
 
-    prompt = f"""
+    return f"""
 Target: {target}
 
 Dictionary data:
@@ -107,13 +119,19 @@ Example2: {examples[1] if len(examples) > 1 else "N/A"}
 Synonyms: {", ".join(synonyms) if synonyms else "None"}{similarity_note}
 """
 
-    return call_llm(SYSTEM_PROMPT_VOCAB, prompt)
+# Search dictionary and generate formatted explanation with LLM
+def handle_vocab_core(user_input: str, target: str) -> str:
+    entries = find_vocab_entries(target)
+    return call_llm(SYSTEM_PROMPT_VOCAB, build_vocab_prompt(target, entries))
+
+
+NO_VOCAB_TARGET_REPLY = "I couldn't detect which word you're asking about."
 
 
 def handle_vocab(user_input: str) -> str:
     target = extract_vocab_target(user_input)
     if not target:
-        return "I couldn't detect which word you're asking about."
+        return NO_VOCAB_TARGET_REPLY
     return handle_vocab_core(user_input, target)
 
 
@@ -121,3 +139,17 @@ def handle_vocab_with_target(user_input: str, target: str) -> str:
     if not target:
         return handle_vocab(user_input)
     return handle_vocab_core(user_input, target)
+
+
+# Async variant: the TF-IDF search runs in a worker thread and the caller makes the LLM call.
+# vocab_prompt_async returns (system prompt, user prompt), or None if no word was found.
+async def vocab_prompt_async(user_input: str, target: str | None, speculation=None):
+    if not target:
+        target = extract_vocab_target(user_input)
+    if not target:
+        return None
+
+    entries = await speculation.take_vocab(target) if speculation else None
+    if entries is None:
+        entries = await asyncio.to_thread(find_vocab_entries, target)
+    return SYSTEM_PROMPT_VOCAB, build_vocab_prompt(target, entries)
@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+
+# Heavy components load in a background thread once the server is listening, each followed
+# by one warm-up call so the first real request does not pay for lazy initialisation.
+# /readyz reports the per-component status; with WARMUP_ON_STARTUP=0 everything loads on first use.
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") != "0"
+
+_components = {}
+_lock = threading.Lock()
+_thread = None
+
+
+def _warm_pool():
+    from inference_pool import warm_up_inference_pool
+    warm_up_inference_pool()
+
+
+def _warm_grammar():
+    from grammar_inference import warm_up_grammar
+    warm_up_grammar()
+
+
+def _warm_quiz():
+    from quiz import warm_up_quiz_model
+    warm_up_quiz_model()
+
+
+def _warm_correction_cache():
+    from grammar_inference import correction_cache
+    correction_cache.warm_up()
+
+
+def _warm_vocab():
+    from vocab_handler import get_store
+    get_store().smart_search("happy")
+
+
+def _warm_intent():
+    from llm_intent import intent_classifier
+    intent_classifier.classify("what does happy mean")
+
+
+# With an inference pool the models live in the workers, which warm up in their initializer;
+# the pool itself is started by the server before this thread exists
+def warmup_steps():
+    from inference_pool import INFERENCE_WORKERS
+
+    if INFERENCE_WORKERS > 0:
+        steps = [("inference_pool", _warm_pool)]
+    else:
+        steps = [("grammar_model", _warm_grammar), ("quiz_model", _warm_quiz)]
+    return steps + [
+        ("correction_cache", _warm_correction_cache),
+        ("vocab_store", _warm_vocab),
+        ("intent_classifier", _warm_intent),
+    ]
+
+
+def _set(name: str, **fields):
+    with _lock:
+        _components[name].update(fields)
+
+
+def _run(steps):
+    started = time.perf_counter()
+
+    for name, step in steps:
+        _set(name, status="loading")
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}")
+            _set(name, status="failed", error=str(e))
+            continue
+
+        seconds = time.perf_counter() - step_started
+        _set(name, status="ready", seconds=round(seconds, 3))
+        print(f"Warm-up: {name} ready in {seconds:.2f}s")
+
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+def start_warmup():
+    global _thread
+
+    steps = warmup_steps()
+    with _lock:
+        if _thread is not None:
+            return
+        for name, _ in steps:
+            _components[name] = {"status": "pending" if WARMUP_ON_STARTUP else "lazy"}
+        if not WARMUP_ON_STARTUP:
+            return
+        _thread = threading.Thread(target=_run, args=(steps,), name="warmup", daemon=True)
+        _thread.start()
+
+
+# Ready once every component has loaded; "lazy" components load on first use and count as ready
+def readiness() -> dict:
+    with _lock:
+        components = {name: dict(state) for name, state in _components.items()}
+
+    ready = bool(components) and all(state["status"] in ("ready", "lazy") for state in components.values())
+    return {"ready": ready, "components": components}